@@ -0,0 +1,4 @@
+"""
+Micro-benchmarks for the rendering hot paths of the image-titler.
+Run them with: python -m benchmarks --help
+"""
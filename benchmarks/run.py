@@ -0,0 +1,280 @@
+"""
+Repeatable timings for the rendering hot paths of the image-titler. Each benchmark
+runs on the bundled sample images and logos or on synthetic inputs at several
+resolutions. Results are written as JSON, and a previous result file can serve as
+a baseline to flag slowdowns.
+
+Usage:
+    python -m benchmarks                               # prints the results as JSON
+    python -m benchmarks -o baseline.json              # stores the results
+    python -m benchmarks -c baseline.json              # flags slowdowns against a baseline
+    python -m benchmarks -k overlay -k font_size       # runs only matching benchmarks
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import timeit
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import PIL
+from PIL import Image
+
+from imagetitler import __version__
+from imagetitler import draw
+from imagetitler import store
+from imagetitler.constants import *
+
+ASSET_IMAGES = sorted(os.path.join(TRC_IMAGES, path) for path in os.listdir(TRC_IMAGES))
+ASSET_LOGOS = {
+    "trc": os.path.join(os.path.dirname(TRC_ICON), "the-renegade-coder-sample-icon.png"),
+    "vf": os.path.join(os.path.dirname(TRC_ICON), "virtual-flat-sample-icon.png"),
+}
+SYNTHETIC_IMAGE_SIZES = [(1280, 720), (1920, 1080), (4000, 3000), (6000, 4000)]
+SYNTHETIC_LOGO_SIZE = (2048, 2048)
+BENCHMARK_TITLE = "Hello World in Python"
+
+DEFAULT_REPEAT = 5
+DEFAULT_TOLERANCE = 0.25
+
+
+def main() -> None:
+    """
+    The benchmark entry point.
+
+    :return: None
+    """
+    args = _parse_args()
+    results = run_benchmarks(args.keyword, args.repeat)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare_results(results, baseline, args.tolerance)
+        _report(results, baseline, regressions)
+        if regressions:
+            sys.exit(1)
+
+
+def run_benchmarks(keywords: Optional[List[str]] = None, repeat: int = DEFAULT_REPEAT) -> dict:
+    """
+    Runs every benchmark whose name contains one of the keywords (or all of them).
+
+    :param keywords: a list of substrings to select benchmarks by
+    :param repeat: the number of timings per benchmark
+    :return: the results, including some metadata about the environment
+    """
+    results = {
+        "metadata": {
+            "image-titler": __version__,
+            "pillow": PIL.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "benchmarks": dict()
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for name, function, *details in _generate_benchmarks(directory):
+            if keywords and not any(keyword in name for keyword in keywords):
+                continue
+            results["benchmarks"][name] = _time(function, repeat)
+            for detail in details:
+                results["benchmarks"][name].update(detail())
+            print(
+                f"{name}: {_format_time(results['benchmarks'][name]['median'])}"
+                f"{_format_size(results['benchmarks'][name])}",
+                file=sys.stderr
+            )
+    return results
+
+
+def compare_results(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> Dict[str, float]:
+    """
+    Compares a set of results against a baseline. A benchmark is flagged as a slowdown
+    when its median time exceeds the baseline median by more than the tolerance.
+    Benchmarks missing from either side are ignored.
+
+    :param results: the current results
+    :param baseline: the baseline results
+    :param tolerance: the allowed slowdown as a fraction (e.g. 0.25 for 25%)
+    :return: a dictionary of flagged benchmark names to their slowdown ratio
+    """
+    regressions = dict()
+    for name, timing in results["benchmarks"].items():
+        if base := baseline["benchmarks"].get(name):
+            ratio = timing["median"] / base["median"]
+            if ratio > 1 + tolerance:
+                regressions[name] = ratio
+    return regressions
+
+
+def _time(function: Callable, repeat: int) -> dict:
+    """
+    A helper function which times a function. The number of calls per timing
+    is picked by timeit, so each timing takes at least 0.2 seconds.
+
+    :param function: the function to time
+    :param repeat: the number of timings
+    :return: the best and median time per call in seconds
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    times = [total / number for total in timer.repeat(repeat=repeat, number=number)]
+    return {"best": min(times), "median": statistics.median(times), "number": number, "repeat": repeat}
+
+
+def _generate_benchmarks(directory: str) -> Iterator[Tuple[str, Callable]]:
+    """
+    A helper function which sets up each benchmark. Synthetic inputs are written
+    to the given directory, as are the outputs of the storage benchmarks. Some
+    benchmarks come with a function that reports extra results (e.g. file sizes)
+    once they've run.
+
+    :param directory: a scratch directory
+    :return: an iterator over (name, function) or (name, function, details) tuples
+    """
+    synthetic_images = dict()
+    for width, height in SYNTHETIC_IMAGE_SIZES:
+        path = os.path.join(directory, f"synthetic-{width}x{height}.jpg")
+        Image.effect_noise((width, height), 48).convert("RGB").save(path, quality=90)
+        synthetic_images[f"{width}x{height}"] = path
+    options = draw.resolve_options()
+
+    def resize(paths: List[str]) -> Callable:
+        return lambda: [draw._resize_image(draw._open_image(options, path), options) for path in paths]
+
+    yield "resize[assets]", resize(ASSET_IMAGES)
+    for label, path in synthetic_images.items():
+        yield f"resize[{label}]", resize([path])
+
+    def font_size(cold: bool) -> Callable:
+        def function():
+            for size in SIZE_MAP:
+                if cold:
+                    draw._load_font.cache_clear()
+                draw._get_appropriate_font_size(BENCHMARK_TITLE, draw.resolve_options(size=size))
+        return function
+
+    yield "font_size[cold]", font_size(cold=True)
+    yield "font_size[warm]", font_size(cold=False)
+
+    base = draw._resize_image(draw._open_image(options, TRC_IMAGE), options)
+    yield "overlay[draw]", lambda: draw._draw_overlay(base.copy(), draw.RECTANGLE_FILL, BENCHMARK_TITLE, options)
+
+    def cold_glyphs():
+        draw.TEXT_MASKS.clear()
+        draw._draw_overlay(base.copy(), draw.RECTANGLE_FILL, BENCHMARK_TITLE, options)
+
+    yield "overlay[draw cold glyphs]", cold_glyphs
+    yield "overlay[reuse]", lambda: draw._draw_overlay(
+        base.copy(), draw.RECTANGLE_FILL, BENCHMARK_TITLE, options, reuse_overlay=True
+    )
+
+    logos = {name: Image.open(path).convert("RGBA") for name, path in ASSET_LOGOS.items()}
+    logos["synthetic"] = Image.effect_noise(SYNTHETIC_LOGO_SIZE, 16).convert("RGBA")
+    for name, logo in logos.items():
+        yield f"best_top_color[{name}]", lambda logo=logo: draw._get_best_top_color(logo)
+        yield f"best_top_color_sorted[{name}]", lambda logo=logo: draw._get_best_top_color_sorted(logo)
+
+    exif = Image.Exif()
+    exif[0x010F] = "Camera Maker"  # Make
+    exif[0x0131] = "Photo Editor"  # Software
+    exif_path = os.path.join(directory, "synthetic-exif.jpg")
+    Image.new("RGB", SIZE_MAP[DEFAULT_SIZE]).save(exif_path, exif=exif.tobytes())
+    with_exif = Image.open(exif_path)
+    without_exif = Image.open(TRC_IMAGE)
+    yield "version_exif[with exif]", lambda: store._generate_version_exif(with_exif)
+    yield "version_exif[without exif]", lambda: store._generate_version_exif(without_exif)
+
+    edited_images = draw.process_images(path=TRC_IMAGES, batch=True, jobs=1)[:4]
+    output_path = os.path.join(directory, "output")
+    os.mkdir(output_path)
+    yield "save_copies[4 images]", lambda: store.save_copies(
+        edited_images, batch=True, jobs=1, output_path=output_path
+    )
+
+    for output_format, extension in FORMAT_MAP.items():
+        for encoder in ENCODER_MAP:
+            path = os.path.join(directory, f"encode-{encoder}{extension}")
+            save = (base, path, b"", store._get_save_options(path, encoder=encoder))
+            yield (
+                f"encode[{output_format} {encoder}]",
+                lambda save=save: store._save_image(save),
+                lambda path=path: {"bytes": os.path.getsize(path)}
+            )
+
+
+def _format_size(results: dict) -> str:
+    """
+    A helper function which formats the output size of a benchmark, if any, for display.
+
+    :param results: the results of a benchmark
+    :return: the size in kilobytes or an empty string
+    """
+    return f" ({results['bytes'] / 1000:.1f} kB)" if "bytes" in results else ""
+
+
+def _report(results: dict, baseline: dict, regressions: Dict[str, float]) -> None:
+    """
+    A helper function which prints a comparison against a baseline.
+
+    :param results: the current results
+    :param baseline: the baseline results
+    :param regressions: the flagged benchmarks (see compare_results)
+    :return: None
+    """
+    for name, timing in results["benchmarks"].items():
+        if base := baseline["benchmarks"].get(name):
+            flag = "  SLOWER" if name in regressions else ""
+            print(
+                f"{name}: {_format_time(base['median'])} -> {_format_time(timing['median'])} "
+                f"({timing['median'] / base['median']:.2f}x){flag}",
+                file=sys.stderr
+            )
+    print(f"{len(regressions)} slowdown(s) found", file=sys.stderr)
+
+
+def _format_time(seconds: float) -> str:
+    """
+    A helper function which formats a time for display.
+
+    :param seconds: a time in seconds
+    :return: the time in milliseconds or microseconds
+    """
+    if seconds < 0.001:
+        return f"{seconds * 1_000_000:.1f} us"
+    return f"{seconds * 1000:.3f} ms"
+
+
+def _parse_args() -> argparse.Namespace:
+    """
+    Parses the command line input of the benchmarks.
+
+    :return: the processed command line arguments
+    """
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("-o", "--output", help="write the results to a JSON file instead of stdout")
+    parser.add_argument("-c", "--compare", help="compare the results against a baseline JSON file")
+    parser.add_argument(
+        "-t",
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="the allowed slowdown against the baseline as a fraction (default: %(default)s)"
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=DEFAULT_REPEAT,
+        help="the number of timings per benchmark (default: %(default)s)"
+    )
+    parser.add_argument("-k", "--keyword", action="append", help="only run benchmarks whose name contains this")
+    return parser.parse_args()
@@ -1,6 +1 @@
-import tomllib
-
-with open("pyproject.toml", "rb") as f:
-    _META = tomllib.load(f)
-
-__version__ = _META["tool"]["poetry"]["version"]
+from imagetitler._version import __version__
@@ -0,0 +1,3 @@
+# Kept in sync with the version in pyproject.toml (see TestVersion), so the
+# version is known without parsing any files or package metadata at import.
+__version__ = "2.5.1"
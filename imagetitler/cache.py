@@ -0,0 +1,222 @@
+"""
+A content-addressed cache of rendered images. Entries are keyed by a hash
+of everything that goes into a render (the input image, the options, the
+font and logo files, and the tool version), and hold the encoded output,
+so a hit skips decoding, drawing, and encoding entirely.
+
+There are two tiers, each bounded in bytes and evicted least recently
+used first: a small one in memory and an optional larger one on disk,
+which survives restarts.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from . import __version__
+from imagetitler.constants import *
+
+IGNORED_OPTIONS = {KEY_CACHE, KEY_PROFILER, KEY_MANIFEST, KEY_JOBS, KEY_OUTPUT_PATH}
+RESOLVED_OPTIONS = {KEY_SIZE: DEFAULT_SIZE, KEY_FONT: DEFAULT_FONT, KEY_ENCODER: DEFAULT_ENCODER,
+                    KEY_MAX_PIXELS: DEFAULT_MAX_PIXELS}
+TRACKED_FILE_OPTIONS = {KEY_FONT, KEY_LOGO_PATH}
+
+MEMORY_CACHE_BYTES = 64 * 1024 * 1024
+NAME_LENGTH_BYTES = 4  # each entry on disk starts with the length of its file name
+FILE_HASH_CACHE_SIZE = 64
+
+
+class RenderCache:
+    """
+    A two-tier cache of encoded images, each stored with its file name.
+    Entries on disk are stored as files named by their key, holding the
+    length of the file name, the file name, then the image. Their
+    modification times track when they were last used, so the order of
+    eviction carries over from one run to the next. The cache may be
+    shared by many threads.
+    """
+
+    def __init__(self, directory: Optional[str] = None, disk_limit: int = DEFAULT_CACHE_SIZE * 1024 * 1024,
+                 memory_limit: int = MEMORY_CACHE_BYTES):
+        self.directory: Optional[Path] = Path(directory) if directory else None
+        self.disk_limit: int = disk_limit
+        self.memory_limit: int = memory_limit
+        self.memory: OrderedDict = OrderedDict()
+        self.memory_bytes: int = 0
+        self.disk: OrderedDict = OrderedDict()
+        self.disk_bytes: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.lock = threading.Lock()
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            entries = [entry for entry in os.scandir(self.directory) if entry.is_file() and "." not in entry.name]
+            for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime_ns):
+                self.disk[entry.name] = entry.stat().st_size
+                self.disk_bytes += entry.stat().st_size
+            self._evict_disk()
+
+    def get(self, key: str) -> Optional[tuple]:
+        """
+        Looks up a rendered image. Hits on disk are promoted to memory.
+
+        :param key: the key of the render (see get_cache_key)
+        :return: a tuple of the file name and the encoded image, or None on a miss
+        """
+        with self.lock:
+            if (entry := self.memory.get(key)) is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return entry
+            on_disk = key in self.disk
+            if on_disk:
+                self.disk.move_to_end(key)
+        entry = self._read(key) if on_disk else None
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._put_memory(key, entry)
+        return entry
+
+    def put(self, key: str, file_name: str, data: bytes) -> None:
+        """
+        Stores a rendered image in both tiers, evicting the least recently
+        used entries as needed. Entries too large for a tier are left out of it.
+
+        :param key: the key of the render (see get_cache_key)
+        :param file_name: the file name of the encoded image
+        :param data: the encoded image
+        :return: None
+        """
+        entry = (file_name, data)
+        with self.lock:
+            self._put_memory(key, entry)
+        if not self.directory:
+            return
+        name = file_name.encode()
+        record = len(name).to_bytes(NAME_LENGTH_BYTES, "big") + name + data
+        if len(record) > self.disk_limit:
+            return
+        temporary_path = self.directory / f"{key}.{threading.get_ident()}.tmp"
+        temporary_path.write_bytes(record)
+        os.replace(temporary_path, self.directory / key)
+        with self.lock:
+            self.disk_bytes += len(record) - self.disk.pop(key, 0)
+            self.disk[key] = len(record)
+            self._evict_disk()
+
+    def summary(self) -> str:
+        """
+        Describes how well the cache is doing.
+
+        :return: a summary string (e.g. "Cache hits: 12, misses: 3")
+        """
+        return f"Cache hits: {self.hits}, misses: {self.misses}"
+
+    def _read(self, key: str) -> Optional[tuple]:
+        """
+        A helper function which reads an entry from disk and marks it as recently used.
+        Entries that have gone missing (e.g. evicted by another thread) or can't be
+        parsed are forgotten.
+
+        :param key: the key of the render
+        :return: a tuple of the file name and the encoded image, or None if it's missing
+        """
+        path = self.directory / key
+        try:
+            record = path.read_bytes()
+            start = NAME_LENGTH_BYTES + int.from_bytes(record[:NAME_LENGTH_BYTES], "big")
+            if len(record) < start:
+                raise ValueError(f"truncated cache entry: {key}")
+            file_name = record[NAME_LENGTH_BYTES:start].decode()
+            os.utime(path)
+        except (FileNotFoundError, ValueError):  # UnicodeDecodeError is a ValueError
+            with self.lock:
+                self.disk_bytes -= self.disk.pop(key, 0)
+            return None
+        return file_name, record[start:]
+
+    def _put_memory(self, key: str, entry: tuple) -> None:
+        """
+        A helper function which stores an entry in memory. The lock must be held.
+
+        :param key: the key of the render
+        :param entry: a tuple of the file name and the encoded image
+        :return: None
+        """
+        size = len(entry[1])
+        if size > self.memory_limit:
+            return
+        if (previous := self.memory.pop(key, None)) is not None:
+            self.memory_bytes -= len(previous[1])
+        self.memory[key] = entry
+        self.memory_bytes += size
+        while self.memory_bytes > self.memory_limit:
+            _, (_, data) = self.memory.popitem(last=False)
+            self.memory_bytes -= len(data)
+
+    def _evict_disk(self) -> None:
+        """
+        A helper function which deletes the least recently used entries on
+        disk until the tier fits within its limit. The lock must be held.
+
+        :return: None
+        """
+        while self.disk_bytes > self.disk_limit:
+            key, size = self.disk.popitem(last=False)
+            self.disk_bytes -= size
+            (self.directory / key).unlink(missing_ok=True)
+
+
+def get_cache_key(image_data: bytes, **kwargs) -> str:
+    """
+    Hashes everything that affects a render: the input image, the options
+    (with defaults filled in, so leaving out an option and passing its default
+    share an entry), the contents of the font and logo files, and the tool
+    version. The path option only contributes its file name, which the default
+    title and output extension are taken from.
+
+    :param image_data: the contents of the input image file
+    :param kwargs: a set of options
+    :return: a hex digest
+    """
+    options = {key: value for key, value in kwargs.items() if key not in IGNORED_OPTIONS and value is not None}
+    for key, default in RESOLVED_OPTIONS.items():
+        options[key] = options.get(key) or default
+    if path := options.get(KEY_PATH):
+        options[KEY_PATH] = Path(path).name
+    for key in TRACKED_FILE_OPTIONS:
+        options[f"{key}_hash"] = _get_file_hash(options[key]) if options.get(key) else None
+    options["version"] = __version__
+    options["image"] = hashlib.sha256(image_data).hexdigest()
+    return hashlib.sha256(json.dumps(options, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _get_file_hash(path: str) -> str:
+    """
+    A helper function which hashes the contents of an option file (i.e. a font or logo).
+    Hashes are cached by path, size, and modification time, so each file is only read once.
+
+    :param path: the path to the file
+    :return: a hex digest of the file
+    """
+    stat = os.stat(path)
+    return _hash_file(path, stat.st_size, stat.st_mtime_ns)
+
+
+@lru_cache(maxsize=FILE_HASH_CACHE_SIZE)
+def _hash_file(path: str, size: int, modified_time: int) -> str:
+    """
+    Hashes the contents of a file.
+
+    :param path: the path to the file
+    :param size: the size of the file (only used as part of the cache key)
+    :param modified_time: the modification time of the file (only used as part of the cache key)
+    :return: a hex digest of the file
+    """
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
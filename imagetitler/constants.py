@@ -9,14 +9,42 @@ KEY_TITLE = "title"
 KEY_NO_TITLE = "no_title"
 KEY_OUTPUT_PATH = "output_path"
 KEY_SIZE = "size"
+KEY_JOBS = "jobs"
+KEY_MAX_PIXELS = "max_pixels"
+KEY_INCREMENTAL = "incremental"
+KEY_MANIFEST = "manifest"
+KEY_SCALE = "scale"
+KEY_PROFILE = "profile"
+KEY_PROFILER = "profiler"
+KEY_FORMAT = "format"
+KEY_ENCODER = "encoder"
+KEY_PIPELINE = "pipeline"
+KEY_RECURSIVE = "recursive"
+KEY_INCLUDE = "include"
+KEY_EXCLUDE = "exclude"
+KEY_HOST = "host"
+KEY_PORT = "port"
+KEY_CACHE = "cache"
+KEY_CACHE_DIR = "cache_dir"
+KEY_CACHE_SIZE = "cache_size"
+KEY_JOBS_FILE = "jobs_file"
+KEY_RESULTS_FILE = "results_file"
 
 FILE_TYPES = [('image files', ('.png', '.jpg', '.jpeg'))]
 
 SEPARATOR = "-"
 
+MANIFEST_FILE_NAME = ".image-titler-manifest.json"
+
 DEFAULT_BATCH_MODE = False
 DEFAULT_FONT = os.path.join(os.path.dirname(__file__), "assets/fonts/BERNHC.TTF")
 DEFAULT_SIZE = "WordPress"
+DEFAULT_ENCODER = "archive"
+DEFAULT_MAX_PIXELS = 50_000_000
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_CACHE_SIZE = 1024  # megabytes
+DEFAULT_JOBS = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
 
 GOLD = (255, 215, 0)
 SILVER = (211, 211, 211)
@@ -33,6 +61,31 @@ SIZE_MAP = {
     "YouTube": (1280, 720)  # Featured image size according to: https://blog.snappa.com/wordpress-featured-image-size/
 }
 
+FORMAT_MAP = {
+    "jpeg": ".jpg",
+    "png": ".png",
+    "webp": ".webp"
+}
+
+# Save settings per output format, keyed by Pillow format name
+ENCODER_MAP = {
+    "archive": {  # Largest files, but no visible loss (the historical behavior)
+        "JPEG": {"quality": 100, "subsampling": 0},
+        "PNG": {"compress_level": 6},
+        "WEBP": {"lossless": True, "quality": 100, "method": 4}
+    },
+    "web": {  # Small files for publishing, at the cost of a slower encode
+        "JPEG": {"quality": 85, "subsampling": 2, "optimize": True, "progressive": True},
+        "PNG": {"compress_level": 9, "optimize": True},
+        "WEBP": {"quality": 85, "method": 6}
+    },
+    "fast": {  # Quick previews and drafts
+        "JPEG": {"quality": 80, "subsampling": 2},
+        "PNG": {"compress_level": 1},
+        "WEBP": {"quality": 80, "method": 0}
+    }
+}
+
 TRC_ICON = os.path.join(os.path.dirname(__file__), 'assets/icons/the-renegade-coder-sample-icon.png')
 TRC_IMAGE = os.path.join(os.path.dirname(__file__), 'assets/images/welcome-to-the-image-titler-by-the-renegade-coder.jpg')
 TRC_IMAGES = os.path.join(os.path.dirname(__file__), 'assets/images/')
@@ -0,0 +1,49 @@
+"""
+Finds the input images of a batch. Directories are scanned lazily, one at a
+time and in sorted order, so the first images are ready to be processed
+before the rest of the tree has even been visited.
+"""
+from fnmatch import fnmatch
+from typing import Iterable, Iterator, Optional
+
+from imagetitler.constants import *
+
+IMAGE_EXTENSIONS = tuple(extension for _, extensions in FILE_TYPES for extension in extensions)
+
+
+def iter_image_files(
+        root: str,
+        recursive: bool = False,
+        include: Optional[Iterable[str]] = None,
+        exclude: Optional[Iterable[str]] = None
+) -> Iterator[str]:
+    """
+    Lists the image files in a directory (and optionally its subdirectories),
+    skipping anything with an extension missing from FILE_TYPES. Glob patterns
+    are matched against paths relative to the root (e.g. "drafts/*.png"). An
+    excluded directory is skipped along with everything in it.
+
+    :param root: the directory to search
+    :param recursive: True to search subdirectories as well
+    :param include: glob patterns that an image must match one of (or None to include every image)
+    :param exclude: glob patterns that an image or directory must not match
+    :return: an iterator over the paths of the images
+    """
+    include = list(include or [])
+    exclude = list(exclude or [])
+    directories = [root]
+    while directories:
+        with os.scandir(directories.pop()) as scan:
+            entries = sorted(scan, key=lambda entry: entry.name)
+        subdirectories = list()
+        for entry in entries:
+            relative_path = os.path.relpath(entry.path, root).replace(os.sep, "/")
+            if any(fnmatch(relative_path, pattern) for pattern in exclude):
+                continue
+            if entry.is_dir():
+                if recursive:
+                    subdirectories.append(entry.path)
+            elif entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+                if not include or any(fnmatch(relative_path, pattern) for pattern in include):
+                    yield entry.path
+        directories.extend(reversed(subdirectories))
@@ -1,15 +1,26 @@
 """
 The functional backend to the image-titler script.
 """
+import io
+import math
+import threading
+import warnings
+from collections import OrderedDict
+from functools import lru_cache, partial
+from itertools import chain, islice
+from operator import itemgetter
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, NamedTuple, Iterator, BinaryIO, Sequence
 
 from PIL import Image
 from PIL import ImageDraw
 from PIL import ImageFont
-from titlecase import titlecase
 
 from imagetitler.constants import *
+from imagetitler.discover import iter_image_files
+from imagetitler.parallel import imap
+from imagetitler.profiling import collect, profiled, record, stage
+from imagetitler.variants import get_variants
 
 TEXT_FILL = (255, 255, 255)
 RECTANGLE_FILL = (201, 2, 41)
@@ -18,6 +29,163 @@ WHITE = (255, 255, 255, 0)
 TOP_RECTANGLE_Y = 20
 X_OFFSET = TOP_RECTANGLE_Y
 LOGO_PADDING = TOP_RECTANGLE_Y
+TEXT_PADDING = 10
+OUTLINE_WIDTH = 4
+
+REDUCING_GAP = 2
+
+MIN_FONT_SIZE = 12
+FONT_CACHE_SIZE = 256
+LAYOUT_CACHE_SIZE = 512
+LOGO_CACHE_SIZE = 32
+OVERLAY_CACHE_SIZE = 16
+TEXT_MASK_CACHE_BYTES = 4 * 1024 * 1024  # per process, so batches on many cores stay small
+
+
+class PixelBudgetError(ValueError):
+    """
+    Raised when an input image would decode to more pixels than the budget
+    allows (see _open_image). Batches skip such images rather than stopping.
+    """
+
+
+class TitleLayout(NamedTuple):
+    """
+    An immutable plan for drawing a title: everything needed to place
+    the title bars and text without measuring the text again.
+    """
+    font: str
+    font_size: int
+    lines: tuple
+    text_positions: tuple
+    rectangles: tuple
+    outline: Optional[tuple]
+    outline_width: int
+
+
+class PreparedLogo(NamedTuple):
+    """
+    A logo that's ready to be pasted: resized to fit the bars, with its
+    alpha mask split out and its dominant color already computed.
+    """
+    image: Image.Image
+    mask: Image.Image
+    color: tuple
+
+
+class RenderOptions(NamedTuple):
+    """
+    The options that shape a render, resolved once per run (see resolve_options),
+    so the drawing helpers never look up sizes, tiers, or defaults again. Being
+    immutable and hashable, a set of options can key a cache directly.
+    """
+    size: str
+    width: int
+    height: int
+    scale: float
+    bar_height: int
+    tier: Optional[str]
+    tier_color: Optional[tuple]
+    font: str
+    logo_path: Optional[str]
+    max_pixels: int
+
+
+class TextMaskCache:
+    """
+    A cache of rendered text masks (see _get_text_mask), evicted least
+    recently used first. It's bounded by the total size of its masks rather
+    than their number, since a single line at full size can take tens of
+    kilobytes. The cache may be shared by many threads.
+    """
+
+    def __init__(self, limit: int = TEXT_MASK_CACHE_BYTES):
+        self.limit: int = limit
+        self.masks: OrderedDict = OrderedDict()
+        self.bytes: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[tuple]:
+        """
+        Looks up a mask.
+
+        :param key: the font, size, text, start, and mode of the mask
+        :return: a tuple of the mask and its offset, or None on a miss
+        """
+        with self.lock:
+            entry = self.masks.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.masks.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: tuple, entry: tuple) -> None:
+        """
+        Stores a mask, evicting the least recently used masks as needed.
+        Masks too large for the cache are left out of it.
+
+        :param key: the font, size, text, start, and mode of the mask
+        :param entry: a tuple of the mask and its offset
+        :return: None
+        """
+        size = _get_mask_bytes(entry)
+        if size > self.limit:
+            return
+        with self.lock:
+            if (previous := self.masks.pop(key, None)) is not None:
+                self.bytes -= _get_mask_bytes(previous)
+            self.masks[key] = entry
+            self.bytes += size
+            while self.bytes > self.limit:
+                _, evicted = self.masks.popitem(last=False)
+                self.bytes -= _get_mask_bytes(evicted)
+
+    def clear(self) -> None:
+        """
+        Empties the cache.
+
+        :return: None
+        """
+        with self.lock:
+            self.masks.clear()
+            self.bytes = 0
+
+
+TEXT_MASKS = TextMaskCache()
+
+
+def resolve_options(**kwargs) -> RenderOptions:
+    """
+    Resolves a set of keyword options into render options, filling in the
+    defaults (e.g. the default size and font). The size is multiplied by
+    the scale option, if provided. In variant mode, options are resolved
+    once per variant (see _resolve_variant_options).
+
+    :param kwargs: a set of options (see parse_input for options)
+    :return: the resolved options
+    """
+    size = kwargs.get(KEY_SIZE) or DEFAULT_SIZE
+    width, height = SIZE_MAP.get(size)
+    scale = kwargs.get(KEY_SCALE) or 1
+    if scale != 1:
+        width, height = round(width * scale), round(height * scale)
+    tier = kwargs.get(KEY_TIER)
+    return RenderOptions(
+        size=size,
+        width=width,
+        height=height,
+        scale=scale,
+        bar_height=height // 7,
+        tier=tier,
+        tier_color=TIER_MAP.get(tier, None),
+        font=kwargs.get(KEY_FONT) or DEFAULT_FONT,
+        logo_path=kwargs.get(KEY_LOGO_PATH),
+        max_pixels=kwargs.get(KEY_MAX_PIXELS) or DEFAULT_MAX_PIXELS
+    )
 
 
 def process_images(**kwargs) -> List[Image.Image]:
@@ -26,98 +194,338 @@ def process_images(**kwargs) -> List[Image.Image]:
     will never return an empty list. If no settings are provided,
     this function will return a default image with a default title.
 
+    Every edited image is held in memory at once. For large batches,
+    see iter_process_images.
+
     :return: None
     """
+    return list(iter_process_images(**kwargs))
+
+
+def iter_process_images(**kwargs) -> Iterator[Image.Image]:
+    """
+    The streaming version of process_images. Images are edited and
+    yielded one at a time, so only a handful of images are ever held
+    in memory, no matter the size of the batch.
+
+    :return: an iterator over the edited images
+    """
     is_batch: bool = kwargs.get(KEY_BATCH)
-    images = list()
     if is_batch:
         kwargs[KEY_PATH] = kwargs.get(KEY_PATH) if kwargs.get(KEY_PATH) else TRC_IMAGES
-        images = _process_batch(**kwargs)
+        yield from _process_batch(**kwargs)
     else:
         kwargs[KEY_PATH] = kwargs.get(KEY_PATH) if kwargs.get(KEY_PATH) else TRC_IMAGE
         if kwargs.get(KEY_NO_TITLE):
             kwargs[KEY_TITLE] = ""
         else:
             kwargs[KEY_TITLE] = kwargs.get(KEY_TITLE) if kwargs.get(KEY_TITLE) else _convert_file_name_to_title(**kwargs)
-        images.append(_process_image(**kwargs))
-    return images
+        profiler = kwargs.pop(KEY_PROFILER, None)
+        with record(enabled=profiler is not None) as timings:
+            edited_images = _process_variants(_resolve_variant_options(**kwargs), kwargs[KEY_TITLE], kwargs[KEY_PATH])
+        if profiler:
+            profiler.add(kwargs[KEY_PATH], timings)
+        for variant, edited_image in zip(get_variants(**kwargs), edited_images):
+            edited_image.variant = variant.tag
+            yield edited_image
+
+
+def process_image_data(image_data: bytes, **kwargs) -> List[Image.Image]:
+    """
+    Edits an image that's already in memory (e.g. an upload) rather than
+    a file on disk. The path option, if provided, only stands in for the
+    name of the file, which the default title and output extension are
+    taken from.
+
+    :param image_data: the contents of an image file
+    :param kwargs: a set of options
+    :return: the edited image of each variant (see get_variants)
+    """
+    kwargs[KEY_PATH] = kwargs.get(KEY_PATH) or "image-titler"
+    if kwargs.get(KEY_NO_TITLE):
+        kwargs[KEY_TITLE] = ""
+    else:
+        kwargs[KEY_TITLE] = kwargs.get(KEY_TITLE) if kwargs.get(KEY_TITLE) else _convert_file_name_to_title(**kwargs)
+    variant_options = _resolve_variant_options(**kwargs)
+    edited_images = _process_variants(variant_options, kwargs[KEY_TITLE], kwargs[KEY_PATH], io.BytesIO(image_data))
+    for variant, edited_image in zip(get_variants(**kwargs), edited_images):
+        edited_image.filename = kwargs[KEY_PATH]
+        edited_image.variant = variant.tag
+    return edited_images
 
 
-def _process_batch(**kwargs) -> List[Image.Image]:
+def _process_batch(**kwargs) -> Iterator[Image.Image]:
     """
-    Processes a batch of images.
+    Processes a batch of images. Files are processed in sorted order,
+    so output indices are stable from run to run, and are discovered
+    lazily, so processing starts right away (see iter_image_files).
+    When more than one job is requested, the images are spread across
+    a process pool. In pipeline mode, files are instead read by one
+    thread pool and rendered by another, so reads overlap with rendering.
+    When a manifest is provided, up-to-date images are skipped. When a
+    profiler is provided, the stage timings of each image are added to it.
+    Images over the pixel budget are skipped with a warning, along with a
+    count of them at the end, and the rest of the batch carries on.
 
     :pre: kwargs.get(KEY_PATH) != None
-    :return: None
+    :return: an iterator over the edited images
     """
-    edited_images = list()
     input_path = kwargs.get(KEY_PATH)
-    for path in os.listdir(input_path):
-        absolute_path = os.path.join(input_path, path)
-        image_kwargs = kwargs.copy()
-        image_kwargs[KEY_PATH] = absolute_path
-        if kwargs.get(KEY_NO_TITLE):
-            image_kwargs[KEY_TITLE] = ""
-        else:
-            image_kwargs[KEY_TITLE] = kwargs.get(KEY_TITLE) if kwargs.get(KEY_TITLE) else _convert_file_name_to_title(**image_kwargs)
+    paths = iter_image_files(
+        input_path,
+        kwargs.get(KEY_RECURSIVE),
+        kwargs.get(KEY_INCLUDE),
+        kwargs.get(KEY_EXCLUDE)
+    )
+    batch = enumerate(paths)
+    if manifest := kwargs.pop(KEY_MANIFEST, None):  # the manifest stays in this process
+        batch = ((index, path) for index, path in batch if not manifest.is_up_to_date(path, **kwargs))
+    profiler = kwargs.pop(KEY_PROFILER, None)  # as is the profiler
+    jobs = kwargs.get(KEY_JOBS) or DEFAULT_JOBS
+    head = list(islice(batch, jobs))  # small batches don't need every job
+    jobs = max(len(head), 1)
+    batch = chain(head, batch)
+    worker = partial(
+        _process_batch_image,
+        variant_options=_resolve_variant_options(**kwargs),
+        title=kwargs.get(KEY_TITLE),
+        no_title=kwargs.get(KEY_NO_TITLE)
+    )
+    worker = profiled(worker, profiler)
+    if kwargs.get(KEY_PIPELINE):
+        reads = imap(profiled(_read_batch_file, profiler), batch, jobs=jobs, threads=True)
+        batch = collect(reads, itemgetter(1), profiler)
+    results = imap(worker, batch, jobs=jobs, threads=bool(kwargs.get(KEY_PIPELINE)))
+    variants = get_variants(**kwargs)
+    skipped = 0
+    for index, path, edited_images in collect(results, itemgetter(1), profiler):
+        if isinstance(edited_images, PixelBudgetError):  # one oversized image shouldn't stop the batch
+            warnings.warn(f"Skipped an image: {edited_images}")
+            skipped += 1
+            continue
+        for variant, edited_image in zip(variants, edited_images):
+            edited_image.filename = path  # filename is not carried over when images are pickled
+            edited_image.batch_index = index  # keeps output indices stable when images are skipped
+            edited_image.batch_directory = _get_batch_directory(path, input_path)  # mirrors the input tree
+            edited_image.variant = variant.tag
+            yield edited_image
+    if skipped:
+        warnings.warn(f"Skipped {skipped} image(s) over the pixel budget")
+
+
+def _get_batch_directory(path: str, input_path: str) -> str:
+    """
+    A helper function which finds the directory of a batch image relative to the batch.
+
+    :param path: the path to the image
+    :param input_path: the path to the batch
+    :return: the relative directory (e.g. "posts/2020") or an empty string for the batch itself
+    """
+    directory = os.path.relpath(os.path.dirname(path), input_path)
+    return "" if directory == os.curdir else directory
+
+
+def _read_batch_file(item: tuple) -> tuple:
+    """
+    A helper function which reads the contents of a batch image.
+
+    :param item: an (index, path) tuple
+    :return: an (index, path, contents) tuple
+    """
+    index, path = item
+    with stage("read"):
+        return index, path, Path(path).read_bytes()
+
+
+def _process_batch_image(
+        item: tuple,
+        variant_options: Sequence[RenderOptions] = (),
+        title: Optional[str] = None,
+        no_title: bool = False
+) -> tuple:
+    """
+    Processes a single image from a batch. The index and path of the image
+    are returned along with its edited images, so they can be matched up
+    no matter where the image was processed.
+
+    :param item: an (index, path) tuple, or an (index, path, contents) tuple if the file was already read
+    :param variant_options: the options of each variant, shared by the batch (see _resolve_variant_options)
+    :param title: the title shared by the batch, or None to use the file name
+    :param no_title: True to leave the title out
+    :return: an (index, path, edited images) tuple, with the edited image of each variant (see get_variants),
+        or the error in place of the edited images if the image is over the pixel budget
+    """
+    index, image_path, image_data = item if len(item) == 3 else (*item, None)
+    if no_title:
+        image_title = ""
+    else:
+        image_title = title if title else _convert_file_name_to_title(path=image_path)
+    source = io.BytesIO(image_data) if image_data is not None else None
+    try:
+        edited_images = _process_variants(variant_options, image_title, image_path, source, reuse_overlay=bool(title))
+    except PixelBudgetError as error:  # returned rather than raised, so the rest of the batch carries on
+        return index, image_path, error
+    return index, image_path, edited_images
+
+
+def _resolve_variant_options(**kwargs) -> List[RenderOptions]:
+    """
+    A helper function which resolves the options of each variant (see get_variants).
 
-        edited_image = _process_image(**image_kwargs)
+    :param kwargs: a set of options
+    :return: the resolved options of each variant, in order
+    """
+    return [
+        resolve_options(**{**kwargs, KEY_SIZE: variant.size, KEY_TIER: variant.tier})
+        for variant in get_variants(**kwargs)
+    ]
+
+
+def _process_variants(
+        variant_options: Sequence[RenderOptions],
+        title: str,
+        path: Optional[str] = None,
+        source: Optional[BinaryIO] = None,
+        reuse_overlay: bool = False
+) -> List[Image.Image]:
+    """
+    Processes every variant of a single image (see get_variants). The image is
+    only decoded once, at the resolution needed by the widest size. Each size
+    is then resized from that decode, and each tier is drawn onto a copy of
+    its resized image.
+
+    :param variant_options: the options of each variant (see _resolve_variant_options)
+    :param title: the title to draw (or an empty string for none)
+    :param path: the path to the image file
+    :param source: the already read contents of the image file (see _open_image)
+    :param reuse_overlay: True if the overlay is shared by many images (see _draw_overlay)
+    :return: the edited image of each variant, in order
+    """
+    if len(variant_options) == 1:
+        return [_process_image(variant_options[0], title, path, source, reuse_overlay)]
+    widest = max(variant_options, key=lambda options: options.width)
+    with stage("decode"):
+        img: Image.Image = _open_image(widest, path, source)
+        img.load()
+    edited_images = list()
+    resized = dict()
+    for options in variant_options:
+        size_options = options._replace(tier=None, tier_color=None)
+        if size_options not in resized:
+            with stage("resize"):
+                cropped_img: Image.Image = _resize_image(img.copy(), options)
+            color = RECTANGLE_FILL
+            if options.logo_path:
+                with stage("logo"):
+                    logo = _get_prepared_logo(options)
+                    color = logo.color
+                    _draw_logo(cropped_img, logo, options)
+            resized[size_options] = (cropped_img, color)
+        cropped_img, color = resized[size_options]
+        edited_image = _draw_overlay(cropped_img.copy(), color, title, options, reuse_overlay)
+        edited_image.filename = getattr(img, "filename", "")
         edited_images.append(edited_image)
     return edited_images
 
 
-def _process_image(**kwargs) -> Image.Image:
+def _process_image(
+        options: RenderOptions,
+        title: str,
+        path: Optional[str] = None,
+        source: Optional[BinaryIO] = None,
+        reuse_overlay: bool = False
+) -> Image.Image:
     """
     Processes a single image.
 
-    :pre: kwargs.get(KEY_PATH) != None and kwargs.get(KEY_TITLE) != None
+    :param options: the render options
+    :param title: the title to draw (or an empty string for none)
+    :param path: the path to the image file
+    :param source: the already read contents of the image file (see _open_image)
+    :param reuse_overlay: True if the overlay is shared by many images (see _draw_overlay)
     :return: the edited image or None
     """
-    input_path = kwargs.get(KEY_PATH)  # TODO: might be able to speed things up by caching this
-    img: Image.Image = Image.open(input_path)
-    cropped_img: Image.Image = _resize_image(img, **kwargs)
+    with stage("decode"):
+        img: Image.Image = _open_image(options, path, source)
+        img.load()
+    with stage("resize"):
+        cropped_img: Image.Image = _resize_image(img, options)
     if hasattr(img, "filename"):
         cropped_img.filename = img.filename  # Ensures filename data is transferred to updated copy
     color = RECTANGLE_FILL
-    if logo_path := kwargs.get(KEY_LOGO_PATH):
-        logo: Image.Image = Image.open(logo_path).convert("RGBA")
-        color = _get_best_top_color(logo)
-        _draw_logo(cropped_img, logo, **kwargs)
+    if options.logo_path:
+        with stage("logo"):
+            logo = _get_prepared_logo(options)
+            color = logo.color
+            _draw_logo(cropped_img, logo, options)
     edited_image = _draw_overlay(
         cropped_img,
         color,
-        **kwargs
+        title,
+        options,
+        reuse_overlay
     )
     return edited_image
 
 
-def _resize_image(img: Image.Image, **kwargs) -> Image.Image:
+def _open_image(options: RenderOptions, path: Optional[str] = None, source: Optional[BinaryIO] = None) -> Image.Image:
+    """
+    A helper function which opens the input image. Decoders that support it
+    (i.e. JPEG) are asked to scale the image down while decoding, so large
+    photos are never decoded at full resolution only to be thrown away by
+    _resize_image. The image is decoded at no less than REDUCING_GAP times
+    the output width, which keeps the final resize just as sharp, unless
+    the pixel budget calls for an even smaller decode.
+
+    :pre: path != None or source != None
+    :param options: the render options
+    :param path: the path to the image file
+    :param source: a file object to read the image from instead of the path
+    :raises PixelBudgetError: if the decoded image would exceed the pixel budget
+    :return: the opened (but not yet loaded) image
+    """
+    img: Image.Image = Image.open(source if source is not None else path)
+    max_pixels = options.max_pixels
+    scale = 1
+    while scale < 8 and math.ceil(img.size[0] / scale) * math.ceil(img.size[1] / scale) > max_pixels:
+        scale *= 2  # JPEG decoders can scale by 1/2, 1/4, or 1/8
+    request = max(min(options.width * REDUCING_GAP, img.size[0] // scale), 1)
+    img.draft(None, (request, 1))  # only the width constrains the resize
+    if img.size[0] * img.size[1] > max_pixels:
+        img.close()
+        raise PixelBudgetError(
+            f"{path} would decode to {img.size[0]}x{img.size[1]} pixels, "
+            f"which exceeds the budget of {max_pixels} pixels"
+        )
+    return img
+
+
+def _resize_image(img: Image.Image, options: RenderOptions) -> Image.Image:
     """
     A helper function which resizes an image. First, the image is constrained
     by its width. Then, any excess height is cropped until the desired aspect
     ratio is achieved. See "size" option for more details.
 
     :param img: an image to be resized
-    :param kwargs: a set of options
+    :param options: the render options
     :return: a resized image
     """
-    size = _retrieve_size_from_options(**kwargs)
-    img.thumbnail((size[0], img.size[1]))
-    cropped_img: Image = img.crop((0, 0, size[0], size[1]))
+    img.thumbnail((options.width, img.size[1]))
+    cropped_img: Image = img.crop((0, 0, options.width, options.height))
     return cropped_img
 
 
-def _retrieve_size_from_options(**kwargs) -> tuple:
+def _scale_length(length: int, options: RenderOptions) -> int:
     """
-    A helper function for retrieving a size tuple from the SIZE_MAP.
+    A helper function which scales a fixed length (e.g. an offset) by the scale option.
+    Scaled renders (e.g. previews) keep the layout of a full size render at a fraction
+    of the cost.
 
-    :param kwargs: a set of options
-    :return: a size tuple
+    :param length: a length in pixels at full size
+    :param options: the render options
+    :return: the scaled length in pixels (at least 1)
     """
-    size = SIZE_MAP.get(DEFAULT_SIZE)
-    if size_key := kwargs.get(KEY_SIZE):
-        size = SIZE_MAP.get(size_key)
-    return size
+    return max(round(length * options.scale), 1)
 
 
 def _convert_file_name_to_title(**kwargs) -> Optional[str]:
@@ -130,70 +538,109 @@ def _convert_file_name_to_title(**kwargs) -> Optional[str]:
     title: Optional[str] = kwargs.get(KEY_TITLE)
     path: Optional[str] = kwargs.get(KEY_PATH)
     if not title and path:
+        from titlecase import titlecase  # deferred, since it's slow to import
         file_path = Path(path).resolve().stem
         title = titlecase(file_path.replace(kwargs.get("separator", SEPARATOR), ' '))
     return title
 
 
-def _get_bar_height(**kwargs) -> int:
+def _get_rectangle(position: int, width: int, options: RenderOptions) -> tuple:
     """
-    A helper function which retrieves the bar height based on the size of the image.
+    Computes the corners of a title bar given the intended position and
+    width of the text it holds.
 
-    :param kwargs: a set of options
-    :return: the bar height in pixels
+    :param position: the position of the rectangle to be added
+    :param width: the width of the rectangle to be added
+    :param options: the render options
+    :return: the top left and bottom right corners as a pair of (x, y) tuples
     """
-    image_size = _retrieve_size_from_options(**kwargs)
-    return image_size[1] // 7
+    return (
+        (options.width - width - _scale_length(X_OFFSET, options) * 2, position),
+        (options.width, position + options.bar_height)
+    )
 
 
 def _draw_rectangle(
         draw: ImageDraw,
-        position: int,
-        width: int,
+        rectangle: tuple,
         color: tuple = RECTANGLE_FILL,
-        **kwargs
+        outline: tuple = None,
+        outline_width: int = OUTLINE_WIDTH
 ):
     """
     Draws a rectangle over the image given a ImageDraw object and the intended
-    position, width, and tier.
+    corners, fill, and outline (i.e. tier color).
 
-    :param color: the color of the overlay bar
     :param draw: an picture we're editing
-    :param position: the position of the rectangle to be added
-    :param width: the width of the rectangle to be added
+    :param rectangle: the corners of the rectangle (see _get_rectangle)
+    :param color: the color of the overlay bar
+    :param outline: the color of the border or None
+    :param outline_width: the width of the border
     :return: nothing
     """
-    image_width = _retrieve_size_from_options(**kwargs)[0]
     draw.rectangle(
-        (
-            (image_width - width - X_OFFSET * 2, position),
-            (image_width, position + _get_bar_height(**kwargs))
-        ),
+        rectangle,
         fill=color,
-        outline=TIER_MAP.get(kwargs.get(KEY_TIER), None),
-        width=4
+        outline=outline,
+        width=outline_width
     )
 
 
-def _draw_text(draw: ImageDraw, position: tuple, text: str, font: ImageFont):
+def _draw_text(draw: ImageDraw, position: tuple, text: str, font: str, font_size: int, fill=TEXT_FILL):
     """
-    Draws text on the image.
+    Draws text on the image by pasting its rendered mask (see _get_text_mask)
+    in the fill color. This matches ImageDraw.text pixel for pixel, but text
+    that's been drawn before skips FreeType entirely.
 
     :param draw: the picture to edit
     :param position: the position of the text as an (x, y) tuple
     :param text: the text
-    :param font: the font of the text
+    :param font: the path to the font file
+    :param font_size: the size of the font
+    :param fill: the color of the text
     :return: nothing
     """
-    draw.text(
-        position,
-        text,
-        fill=TEXT_FILL,
-        font=font
-    )
+    x, y = position
+    start = (math.modf(x)[0], math.modf(y)[0])
+    mask, (offset_x, offset_y) = _get_text_mask(font, font_size, text, start, draw.fontmode)
+    draw.bitmap((int(x) + offset_x, int(y) + offset_y), mask, fill=fill)
+
+
+def _get_text_mask(font: str, font_size: int, text: str, start: tuple, mode: str) -> tuple:
+    """
+    Renders the mask of a line of text. Masks are cached by font, size, and
+    text (along with the subpixel start and mode that FreeType renders with),
+    so recurring lines (e.g. "Hello World in") are only rendered once while
+    they stay in the cache (see TextMaskCache).
+
+    :param font: the path to the font file
+    :param font_size: the size of the font
+    :param text: the text
+    :param start: the fractional part of the (x, y) position of the text
+    :param mode: the font mode ("L" for antialiased text or "1" for none)
+    :return: a tuple of the mask and its (x, y) offset from the position of the text
+    """
+    key = (font, font_size, text, start, mode)
+    if (entry := TEXT_MASKS.get(key)) is not None:
+        return entry
+    mask, offset = _load_font(font, font_size).getmask2(text, mode, start=start)
+    entry = (Image.Image()._new(mask), offset)  # getmask2 returns a bare core image
+    TEXT_MASKS.put(key, entry)
+    return entry
+
+
+def _get_mask_bytes(entry: tuple) -> int:
+    """
+    A helper function which measures the memory held by a cached text mask.
+
+    :param entry: a tuple of the mask and its offset
+    :return: the size of the mask in bytes
+    """
+    mask = entry[0]
+    return mask.width * mask.height * len(mask.getbands())
 
 
-def _get_text_position(text_width, text_height, text_ascent, y_offset, **kwargs) -> tuple:
+def _get_text_position(text_width, text_height, text_ascent, y_offset, options: RenderOptions) -> tuple:
     """
     A helper function which places the text safely within the title block.
 
@@ -203,12 +650,12 @@ def _get_text_position(text_width, text_height, text_ascent, y_offset, **kwargs)
     :param text_height: the height of the text without the ascent
     :param text_ascent: the height of the ascent
     :param y_offset: the y location of the title block
+    :param options: the render options
     :return: a tuple containing the x, y pixel coordinates of the text
     """
-    image_width = _retrieve_size_from_options(**kwargs)[0]
     return (
-        image_width - text_width - X_OFFSET,
-        y_offset - text_ascent + (_get_bar_height(**kwargs) - text_height) / 2
+        options.width - text_width - _scale_length(X_OFFSET, options),
+        y_offset - text_ascent + (options.bar_height - text_height) / 2
     )
 
 
@@ -225,82 +672,236 @@ def _get_text_metrics(text: str, font: ImageFont):
     return width, offset_y, ascent - offset_y, descent
 
 
-def _get_appropriate_font_size(**kwargs) -> ImageFont:
+def _get_appropriate_font_size(title: str, options: RenderOptions) -> ImageFont:
     """
-    A helper function which computes the font size given a set of options.
+    A helper function which computes the font size given a title and its options.
+    The font size is the smallest size (starting from MIN_FONT_SIZE) whose
+    title bounding box reaches the bottom of the bar minus some padding.
+    Rather than stepping through every size, the size is bracketed by
+    doubling and then narrowed down with a binary search.
 
-    :param kwargs: a set of options
+    :param title: the title to be drawn
+    :param options: the render options
     :return: a font of the appropriate size
     """
-    bar_height = _get_bar_height(**kwargs)
-    font = kwargs.get(KEY_FONT, DEFAULT_FONT)
-    font = font if font else DEFAULT_FONT
-    title = kwargs.get(KEY_TITLE)
-    font_size = 12
-    while ImageFont.truetype(font, font_size).getbbox(title)[3] < bar_height - 10:
-        font_size += 1
+    font = options.font
+    target = options.bar_height - _scale_length(TEXT_PADDING, options)
+
+    def fits(size: int) -> bool:
+        return _load_font(font, size).getbbox(title)[3] >= target
+
+    low = high = _scale_length(MIN_FONT_SIZE, options)
+    while not fits(high):
+        low, high = high + 1, high * 2
+    while low < high:
+        middle = (low + high) // 2
+        if fits(middle):
+            high = middle
+        else:
+            low = middle + 1
+    return _load_font(font, high)
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def _load_font(font: str, font_size: int) -> ImageFont.FreeTypeFont:
+    """
+    A helper function which loads a font from disk. Loaded fonts are
+    cached by path and size, so repeated lookups avoid rereading the
+    font file.
+
+    :param font: the path to a font file
+    :param font_size: the size of the font
+    :return: the loaded font
+    """
     return ImageFont.truetype(font, font_size)
 
 
-def _draw_overlay(image: Image.Image, color: tuple, **kwargs) -> Image:
+def _draw_overlay(
+        image: Image.Image,
+        color: tuple,
+        title: Optional[str],
+        options: RenderOptions,
+        reuse_overlay: bool = False
+) -> Image:
     """
     Draws text over an image.
 
     :param image: an image
+    :param color: the color of the overlay bars
+    :param title: the title to draw (or None for none)
+    :param options: the render options
+    :param reuse_overlay: True if the overlay is shared by many images (e.g. a batch with a fixed title)
     :return: the updated image
     """
-    draw = ImageDraw.Draw(image)
-
-    if title := kwargs.get(KEY_TITLE):
-        font = _get_appropriate_font_size(**kwargs)
-        title = title.strip()
-        # Detect space (precondition for split)
-        if len(title.split()) > 1:
-            top_half_text, bottom_half_text = _split_string_by_nearest_middle_space(title)
-        else:
-            top_half_text, bottom_half_text = title, None
+    if title:
+        with stage("font"):
+            layout = _get_title_layout(title, options)
+        with stage("overlay"):
+            if reuse_overlay:
+                layer, mask, offset = _get_overlay_layer(layout, color, image.mode)
+                image.paste(layer, offset, mask)
+            else:
+                _draw_layout(ImageDraw.Draw(image), layout, color)
 
-        # Draw top
-        width, top_offset, height, _ = _get_text_metrics(top_half_text, font)
-        top_position = _get_text_position(width, height, top_offset, TOP_RECTANGLE_Y, **kwargs)
-        _draw_rectangle(draw, TOP_RECTANGLE_Y, width, color, **kwargs)
-        _draw_text(draw, top_position, top_half_text, font)
+    return image
 
-        bottom_rectangle_y = TOP_RECTANGLE_Y + _get_bar_height(**kwargs) + TOP_RECTANGLE_Y
 
-        # Draw bottom
-        if bottom_half_text:
-            width, top_offset, height, _ = _get_text_metrics(bottom_half_text, font)
-            bottom_position = _get_text_position(width, height, top_offset, bottom_rectangle_y, **kwargs)
-            _draw_rectangle(draw, bottom_rectangle_y, width, color, **kwargs)
-            _draw_text(draw, bottom_position, bottom_half_text, font)
+def _draw_layout(draw: ImageDraw, layout: TitleLayout, color: tuple):
+    """
+    Draws the title bars and text of a layout.
 
-    return image
+    :param draw: the picture to edit
+    :param layout: the layout of the title
+    :param color: the color of the overlay bars
+    :return: nothing
+    """
+    for line, position, rectangle in zip(layout.lines, layout.text_positions, layout.rectangles):
+        _draw_rectangle(draw, rectangle, color, layout.outline, layout.outline_width)
+        _draw_text(draw, position, line, layout.font, layout.font_size)
+
+
+@lru_cache(maxsize=OVERLAY_CACHE_SIZE)
+def _get_overlay_layer(layout: TitleLayout, color: tuple, mode: str) -> tuple:
+    """
+    Renders the title bars and text of a layout once, as a layer and a mask,
+    so every image that shares a title only needs a single paste. The mask
+    is opaque across the bars, and carries the coverage of any text that
+    spills past them (e.g. descenders and accents), where the layer is solid
+    text color so the text is only blended once. Pasting the layer therefore
+    reproduces exactly what drawing straight onto the image would.
+
+    :param layout: the layout of the title
+    :param color: the color of the overlay bars
+    :param mode: the mode of the image the layer will be pasted onto
+    :return: a tuple of the layer, its mask, and the (x, y) offset to paste it at
+    """
+    width = max(rectangle[1][0] for rectangle in layout.rectangles)
+    height = max(rectangle[1][1] for rectangle in layout.rectangles) + TOP_RECTANGLE_Y
+    layer = Image.new(mode, (width, height))
+    mask = Image.new("L", (width, height))
+    _draw_layout(ImageDraw.Draw(layer), layout, color)
+    mask_draw = ImageDraw.Draw(mask)
+    spill = Image.new("L", (width, height))
+    spill_draw = ImageDraw.Draw(spill)
+    for line, position, rectangle in zip(layout.lines, layout.text_positions, layout.rectangles):
+        mask_draw.rectangle(rectangle, fill=255)
+        _draw_text(mask_draw, position, line, layout.font, layout.font_size, fill=255)
+        _draw_text(spill_draw, position, line, layout.font, layout.font_size, fill=255)
+    for rectangle in layout.rectangles:
+        spill_draw.rectangle(rectangle, fill=0)
+    ImageDraw.Draw(layer).bitmap((0, 0), spill.point(lambda value: 255 if value else 0), fill=TEXT_FILL)
+    box = mask.getbbox()
+    return layer.crop(box), mask.crop(box), box[:2]
+
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def _get_title_layout(title: str, options: RenderOptions) -> TitleLayout:
+    """
+    Plans the layout of a title for a given set of options (i.e. font, size,
+    tier, and scale). Plans are cached, so repeated titles skip text
+    measurement entirely.
+
+    :param title: the title to be drawn
+    :param options: the render options
+    :return: the layout of the title
+    """
+    measured = _measure_title_layout(title, options._replace(tier=None, tier_color=None, logo_path=None, max_pixels=0))
+    return measured._replace(outline=options.tier_color)
+
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def _measure_title_layout(title: str, options: RenderOptions) -> TitleLayout:
+    """
+    Measures a title and computes where each line of it belongs. Options
+    with no effect on measurement (e.g. the tier) are cleared by the
+    caller, so they don't split this cache.
+
+    :param title: the title to be drawn
+    :param options: the render options
+    :return: the layout of the title without an outline
+    """
+    font = _get_appropriate_font_size(title, options)
+    title = title.strip()
+    # Detect space (precondition for split)
+    if len(title.split()) > 1:
+        top_half_text, bottom_half_text = _split_string_by_nearest_middle_space(title)
+    else:
+        top_half_text, bottom_half_text = title, None
+    lines = (top_half_text, bottom_half_text) if bottom_half_text else (top_half_text,)
+
+    text_positions, rectangles = list(), list()
+    y_offset = _scale_length(TOP_RECTANGLE_Y, options)
+    for line in lines:
+        width, top_offset, height, _ = _get_text_metrics(line, font)
+        text_positions.append(_get_text_position(width, height, top_offset, y_offset, options))
+        rectangles.append(_get_rectangle(y_offset, width, options))
+        y_offset += options.bar_height + _scale_length(TOP_RECTANGLE_Y, options)
+
+    return TitleLayout(
+        font=options.font,
+        font_size=font.size,
+        lines=tuple(lines),
+        text_positions=tuple(text_positions),
+        rectangles=tuple(rectangles),
+        outline=None,
+        outline_width=_scale_length(OUTLINE_WIDTH, options)
+    )
 
 
-def _get_logo_size(**kwargs) -> tuple:
+def _get_logo_size(options: RenderOptions) -> tuple:
     """
     A helper function that retrieves the size of the logo based on the size of the bars.
 
-    :param kwargs: a set of options
+    :param options: the render options
     :return: a logo size tuple
     """
-    bar_height = _get_bar_height(**kwargs)
-    return bar_height, bar_height
+    return options.bar_height, options.bar_height
 
 
-def _draw_logo(img: Image.Image, logo: Image.Image, **kwargs):
+def _get_prepared_logo(options: RenderOptions) -> PreparedLogo:
+    """
+    A helper function which retrieves the logo from the logo path option,
+    ready to be drawn. Prepared logos are cached by path, modification time,
+    and bar height, so a logo is only loaded once per batch (or GUI session)
+    unless the file changes.
+
+    :pre: options.logo_path != None
+    :param options: the render options
+    :return: the prepared logo
+    """
+    logo_path = options.logo_path
+    return _prepare_logo(logo_path, os.stat(logo_path).st_mtime_ns, options.bar_height)
+
+
+@lru_cache(maxsize=LOGO_CACHE_SIZE)
+def _prepare_logo(logo_path: str, modified_time: int, bar_height: int) -> PreparedLogo:
+    """
+    Loads a logo, computes its dominant color, and resizes it to fit beside the bars.
+
+    :param logo_path: the path to the logo file
+    :param modified_time: the modification time of the logo file (only used as part of the cache key)
+    :param bar_height: the height of the title bars
+    :return: the prepared logo
+    """
+    logo: Image.Image = Image.open(logo_path).convert("RGBA")
+    color = _get_best_top_color(logo)
+    logo.thumbnail((bar_height, bar_height))
+    return PreparedLogo(logo, logo.getchannel("A"), color)
+
+
+def _draw_logo(img: Image.Image, logo: PreparedLogo, options: RenderOptions):
     """
     Adds a logo to the image if a path is provided.
 
     :param img: an image to be modified
-    :param logo: the logo file to be added
+    :param logo: the prepared logo to be added
+    :param options: the render options
     :return: nothing
     """
-    logo_size = _get_logo_size(**kwargs)
-    logo.thumbnail(logo_size)
+    logo_size = _get_logo_size(options)
+    padding = _scale_length(LOGO_PADDING, options)
     _, height = img.size
-    img.paste(logo, (LOGO_PADDING, height - logo_size[1] - LOGO_PADDING), logo)
+    img.paste(logo.image, (padding, height - logo_size[1] - padding), logo.mask)
 
 
 def _split_string_by_nearest_middle_space(input_string: str) -> tuple:
@@ -320,15 +921,52 @@ def _split_string_by_nearest_middle_space(input_string: str) -> tuple:
     return input_string[:index], input_string[index + 1:]
 
 
-def _get_best_top_color(image: Image.Image) -> tuple:
+def _get_best_top_color(image: Image.Image, max_samples: Optional[int] = None) -> tuple:
+    """
+    Computes the most popular non-white color from an image. When NumPy is
+    available, RGBA pixels are packed into integers and counted in bulk,
+    with the same result as sorting. When max_samples is provided, images
+    with more pixels than that are sampled on an evenly spaced grid instead,
+    which bounds the cost for large logos but may pick a different color.
+
+    :param image: an image file
+    :param max_samples: the maximum number of pixels to count, or None to count every pixel
+    :raises ValueError: if the image has no color other than white
+    :return: the most dominant color as a tuple
     """
-    Computes the most popular non-white color from an image.
+    if image.mode != "RGBA":
+        return _get_best_top_color_sorted(image)
+    try:
+        import numpy  # deferred, since it's slow to import
+    except ImportError:
+        return _get_best_top_color_sorted(image)
+    pixels = numpy.asarray(image)
+    if max_samples:
+        step = math.ceil(math.sqrt(pixels.shape[0] * pixels.shape[1] / max_samples))
+        if step > 1:
+            pixels = numpy.ascontiguousarray(pixels[::step, ::step])
+    packed = pixels.view(">u4").ravel()  # RGBA bytes read as one big-endian integer preserve tuple ordering
+    colors, counts = numpy.unique(packed, return_counts=True)
+    counts[colors == int.from_bytes(bytes(WHITE), "big")] = 0
+    if not counts.any():
+        raise ValueError("the image has no color other than white")
+    best = numpy.flatnonzero(counts == counts.max())[-1]  # ties go to the larger color, like sorting tuples
+    return tuple(int(channel) for channel in int(colors[best]).to_bytes(4, "big"))
+
+
+def _get_best_top_color_sorted(image: Image.Image) -> tuple:
+    """
+    Computes the most popular non-white color from an image by sorting
+    every color in the image. This is the fallback when NumPy isn't installed.
 
     :param image: an image file
+    :raises ValueError: if the image has no color other than white
     :return: the most dominant color as a tuple
     """
     top_colors = sorted(image.getcolors(image.size[0] * image.size[1]), reverse=True)
     curr_color = iter(top_colors)
-    while (color := next(curr_color)[1]) == WHITE:
+    while (color := next(curr_color, (0, None))[1]) == WHITE:
         pass
+    if color is None:
+        raise ValueError("the image has no color other than white")
     return color
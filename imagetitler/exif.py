@@ -0,0 +1,144 @@
+"""
+Just enough EXIF handling to tag images with a user comment. Rather than
+decoding and re-serializing every field, the comment is spliced into the
+existing EXIF data: the two directories that need a new entry are copied
+to the end of the data, and everything else (e.g. orientation, camera
+details, thumbnails) is left byte-for-byte intact.
+"""
+import struct
+from functools import lru_cache
+
+EXIF_HEADER = b"Exif\x00\x00"
+EMPTY_TIFF = b"II*\x00\x08\x00\x00\x00\x00\x00\x00\x00\x00\x00"  # a header and an empty IFD0
+MAX_EXIF_LENGTH = 65533  # the payload limit of a JPEG APP1 segment
+
+EXIF_IFD_POINTER = 0x8769
+USER_COMMENT = 0x9286
+LONG = 4
+UNDEFINED = 7
+
+
+def add_user_comment(exif: bytes, comment: str) -> bytes:
+    """
+    Sets the UserComment field of a block of EXIF data. When there's already
+    a comment with enough room, it's overwritten in place. Otherwise, the
+    comment is spliced in. Data that can't be parsed, or that would grow too
+    large to fit in a JPEG, is returned as is.
+
+    :param exif: the EXIF data, with or without the "Exif" header
+    :param comment: an ASCII comment (e.g. "image-titler-v2-5-1")
+    :return: the updated EXIF data
+    """
+    prefix = EXIF_HEADER if exif.startswith(EXIF_HEADER) else b""
+    tiff = bytearray(exif[len(prefix):])
+    try:
+        order = {b"II": "<", b"MM": ">"}[bytes(tiff[:2])]
+        ifd0_entries, ifd0_next = _read_ifd(tiff, order, _read_long(tiff, order, 4))
+        exif_offset = 0
+        if pointer := ifd0_entries.get(EXIF_IFD_POINTER):
+            exif_offset = _read_long(pointer, order, 8)
+            exif_entries, exif_next = _read_ifd(tiff, order, exif_offset)
+        else:
+            exif_entries, exif_next = dict(), 0
+    except (KeyError, struct.error):
+        return exif
+    value = b"ASCII\x00\x00\x00" + comment.encode("ascii")
+    if (entry := exif_entries.get(USER_COMMENT)) and 4 < len(value) <= _read_long(entry, order, 4):
+        position = exif_offset + 2 + 12 * list(exif_entries).index(USER_COMMENT)
+        value_offset = _read_long(entry, order, 8)
+        if value_offset + len(value) <= len(tiff):
+            tiff[position + 4:position + 8] = struct.pack(f"{order}I", len(value))
+            tiff[value_offset:value_offset + len(value)] = value
+            return prefix + bytes(tiff)
+    exif_entries[USER_COMMENT] = _make_entry(order, USER_COMMENT, UNDEFINED, len(value), _append(tiff, value))
+    exif_offset = _append(tiff, _make_ifd(order, exif_entries, exif_next))
+    ifd0_entries[EXIF_IFD_POINTER] = _make_entry(order, EXIF_IFD_POINTER, LONG, 1, exif_offset)
+    tiff[4:8] = struct.pack(f"{order}I", _append(tiff, _make_ifd(order, ifd0_entries, ifd0_next)))
+    if len(prefix) + len(tiff) > MAX_EXIF_LENGTH:
+        return exif
+    return prefix + bytes(tiff)
+
+
+@lru_cache(maxsize=None)
+def create_exif(comment: str) -> bytes:
+    """
+    Creates a minimal block of EXIF data that holds nothing but a user comment.
+    Blocks are cached, so a run only ever builds one.
+
+    :param comment: an ASCII comment (e.g. "image-titler-v2-5-1")
+    :return: the EXIF data, with the "Exif" header
+    """
+    return add_user_comment(EXIF_HEADER + EMPTY_TIFF, comment)
+
+
+def _read_long(data: bytes, order: str, offset: int) -> int:
+    """
+    A helper function which reads an unsigned 32-bit integer.
+
+    :param data: the data to read from
+    :param order: the byte order ("<" or ">")
+    :param offset: the offset of the integer
+    :return: the integer
+    """
+    return struct.unpack_from(f"{order}I", data, offset)[0]
+
+
+def _read_ifd(tiff: bytes, order: str, offset: int) -> tuple:
+    """
+    A helper function which reads the raw entries of an image file directory (IFD).
+    Entries are kept as raw 12-byte records, so their values are never decoded.
+
+    :param tiff: the TIFF data
+    :param order: the byte order ("<" or ">")
+    :param offset: the offset of the IFD
+    :return: a tuple of a dictionary of tags to entries and the offset of the next IFD
+    """
+    count = struct.unpack_from(f"{order}H", tiff, offset)[0]
+    entries = dict()
+    for position in range(offset + 2, offset + 2 + 12 * count, 12):
+        entry = bytes(tiff[position:position + 12])
+        entries[struct.unpack_from(f"{order}H", entry)[0]] = entry
+    return entries, _read_long(tiff, order, offset + 2 + 12 * count)
+
+
+def _make_entry(order: str, tag: int, field_type: int, count: int, value: int) -> bytes:
+    """
+    A helper function which creates an IFD entry whose value is a single long
+    (i.e. an offset or a pointer).
+
+    :param order: the byte order ("<" or ">")
+    :param tag: the tag of the entry
+    :param field_type: the type of the entry
+    :param count: the number of values in the entry
+    :param value: the value or offset of the entry
+    :return: the 12-byte entry
+    """
+    return struct.pack(f"{order}HHII", tag, field_type, count, value)
+
+
+def _make_ifd(order: str, entries: dict, next_offset: int) -> bytes:
+    """
+    A helper function which creates an IFD from a set of raw entries, sorted by tag.
+
+    :param order: the byte order ("<" or ">")
+    :param entries: a dictionary of tags to entries
+    :param next_offset: the offset of the next IFD (or 0)
+    :return: the IFD
+    """
+    body = b"".join(entries[tag] for tag in sorted(entries))
+    return struct.pack(f"{order}H", len(entries)) + body + struct.pack(f"{order}I", next_offset)
+
+
+def _append(tiff: bytearray, data: bytes) -> int:
+    """
+    A helper function which appends data to the TIFF data at a word boundary.
+
+    :param tiff: the TIFF data
+    :param data: the data to append
+    :return: the offset of the appended data
+    """
+    if len(tiff) % 2:
+        tiff.append(0)
+    offset = len(tiff)
+    tiff.extend(data)
+    return offset
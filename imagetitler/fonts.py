@@ -0,0 +1,178 @@
+"""
+A lightweight index of the fonts installed on this machine. Font directories
+are only scanned when the index is missing or out of date, and the results
+are cached on disk, so looking up fonts is usually a matter of a few stats.
+"""
+import json
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from PIL import ImageFont
+
+from imagetitler.constants import *
+
+FONT_EXTENSIONS = (".ttf", ".otf", ".ttc")
+FONT_INDEX_VERSION = 1
+
+
+def _get_font_directories() -> tuple:
+    """
+    A helper function which lists the usual font directories for Windows,
+    macOS, and Linux, along with the fonts bundled with this package.
+
+    :return: a tuple of directory paths
+    """
+    home = Path.home()
+    directories = [
+        os.path.join(os.path.dirname(__file__), "assets/fonts"),
+        os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts"),
+        os.path.join(os.environ.get("LOCALAPPDATA", ""), "Microsoft", "Windows", "Fonts"),
+        "/Library/Fonts",
+        "/System/Library/Fonts",
+        str(home / "Library" / "Fonts"),
+        "/usr/share/fonts",
+        "/usr/local/share/fonts",
+        str(home / ".fonts"),
+        str(home / ".local" / "share" / "fonts"),
+    ]
+    return tuple(directory for directory in directories if os.path.isabs(directory))
+
+
+def _get_cache_path() -> str:
+    """
+    A helper function which picks a per-user location for the font index.
+
+    :return: the path of the font index file
+    """
+    cache_directory = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME")
+    if not cache_directory:
+        cache_directory = str(Path.home() / ".cache")
+    return os.path.join(cache_directory, "image-titler", "fonts.json")
+
+
+FONT_DIRECTORIES = _get_font_directories()
+FONT_INDEX_PATH = _get_cache_path()
+
+
+def load_font_index(
+        directories: Iterable[str] = FONT_DIRECTORIES,
+        index_path: Optional[str] = FONT_INDEX_PATH
+) -> Dict[str, str]:
+    """
+    Retrieves the installed fonts as a dictionary of labels (e.g. "Arial (Bold)")
+    to font paths. The cached index is used as long as the modification time
+    of every scanned directory is unchanged. Otherwise, the directories are
+    scanned again and the cache is replaced.
+
+    :param directories: the font directories to scan
+    :param index_path: the path of the font index file (or None to skip caching)
+    :return: a dictionary of font labels to font paths
+    """
+    roots = [directory for directory in directories if os.path.isdir(directory)]
+    index = _read_font_index(index_path) if index_path else None
+    if not index or index.get("roots") != roots or not _is_current(index):
+        index = _scan_font_directories(roots)
+        if index_path:
+            _write_font_index(index, index_path)
+    return _label_fonts(index["fonts"])
+
+
+def get_font_label(font_path: str) -> str:
+    """
+    Creates the label of a single font file without scanning any directories.
+
+    :param font_path: the path to a font file
+    :return: the label of the font (e.g. "Arial (Bold)")
+    """
+    family, style = ImageFont.truetype(font_path).getname()
+    return f"{family} ({style})"
+
+
+def _is_current(index: dict) -> bool:
+    """
+    A helper function which checks that none of the indexed directories changed.
+
+    :param index: a font index
+    :return: True if every directory has the same modification time as when it was scanned
+    """
+    for directory, modified_time in index["directories"].items():
+        try:
+            if os.stat(directory).st_mtime_ns != modified_time:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def _scan_font_directories(roots: Iterable[str]) -> dict:
+    """
+    A helper function which walks a set of font directories and reads
+    the family and style of every font file it finds.
+
+    :param roots: the font directories to scan
+    :return: a font index
+    """
+    index = {"version": FONT_INDEX_VERSION, "roots": list(roots), "directories": dict(), "fonts": list()}
+    for root in index["roots"]:
+        for directory, _, files in os.walk(root):
+            index["directories"][directory] = os.stat(directory).st_mtime_ns
+            for file in sorted(files):
+                if not file.lower().endswith(FONT_EXTENSIONS):
+                    continue
+                path = os.path.join(directory, file)
+                try:
+                    family, style = ImageFont.truetype(path).getname()
+                except OSError:
+                    continue  # unreadable or unsupported font
+                index["fonts"].append({"family": family, "style": style, "path": path})
+    return index
+
+
+def _label_fonts(fonts: Iterable[dict]) -> Dict[str, str]:
+    """
+    A helper function which assigns each indexed font a unique label.
+
+    :param fonts: the fonts of a font index
+    :return: a dictionary of font labels to font paths
+    """
+    labels = dict()
+    for font in fonts:
+        label = f"{font['family']} ({font['style']})"
+        if label in labels:
+            label = f"{font['family']} ({font['style']}, {Path(font['path']).name})"
+        labels[label] = font["path"]
+    return labels
+
+
+def _read_font_index(index_path: str) -> Optional[dict]:
+    """
+    A helper function which reads a font index from disk.
+
+    :param index_path: the path of the font index file
+    :return: the font index or None if it's missing, unreadable, or from another version
+    """
+    try:
+        with open(index_path) as index_file:
+            index = json.load(index_file)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return index if index.get("version") == FONT_INDEX_VERSION else None
+
+
+def _write_font_index(index: dict, index_path: str) -> None:
+    """
+    A helper function which writes a font index to disk. Failing to write
+    the cache (e.g. a read-only home directory) is not an error.
+
+    :param index: a font index
+    :param index_path: the path of the font index file
+    :return: None
+    """
+    try:
+        Path(index_path).parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = f"{index_path}.tmp"
+        with open(temporary_path, "w") as index_file:
+            json.dump(index, index_file)
+        os.replace(temporary_path, index_path)
+    except OSError:
+        pass
@@ -0,0 +1,143 @@
+"""
+Job files, where each row describes one image to render with its own
+options (e.g. a title, tier, and logo). Rows are read and rendered one at
+a time in a single process, so a file of any length runs in flat memory,
+and fonts, logos, and layouts are cached across every row. The outcome of
+each row is written to a results file as soon as it's known.
+"""
+import csv
+import json
+from pathlib import Path
+from typing import Iterator, Optional
+
+from imagetitler.constants import *
+from imagetitler.draw import iter_process_images
+from imagetitler.store import iter_save_copies
+
+ROW_OPTIONS = {KEY_PATH, KEY_TITLE, KEY_NO_TITLE, KEY_TIER, KEY_SIZE, KEY_LOGO_PATH, KEY_FONT, KEY_OUTPUT_PATH,
+               KEY_FORMAT, KEY_ENCODER}
+ROW_ALIASES = {"logo": KEY_LOGO_PATH, "output": KEY_OUTPUT_PATH}
+CHOICE_OPTIONS = {KEY_TIER: TIER_MAP, KEY_SIZE: SIZE_MAP, KEY_FORMAT: FORMAT_MAP, KEY_ENCODER: ENCODER_MAP}
+LIST_OPTIONS = {KEY_TIER, KEY_SIZE}  # see get_variants
+IGNORED_OPTIONS = {KEY_BATCH, KEY_JOBS_FILE, KEY_RESULTS_FILE, KEY_MANIFEST}
+
+
+def run_jobs(jobs_path: str, results_path: Optional[str] = None, **kwargs) -> tuple:
+    """
+    Renders and saves the image of every row of a job file. Options from
+    the row take priority over the options provided here, which serve as
+    defaults for every row (e.g. an encoder). A row that fails is recorded
+    as an error, and the rest of the rows carry on.
+
+    Each line of the results file is a JSON object with the row number, the
+    input path, and either the saved paths or the error (e.g. {"row": 3,
+    "path": "a.jpg", "status": "ok", "outputs": ["a-v2-5-1.jpg"]}).
+
+    :param jobs_path: the path to a job file (see iter_jobs)
+    :param results_path: the path to the results file (defaults to {job file name}-results.jsonl)
+    :param kwargs: a set of options shared by every row (see parse_input for options)
+    :return: a tuple of the number of rows that succeeded and failed
+    """
+    results_path = results_path or get_results_path(jobs_path)
+    defaults = {key: value for key, value in kwargs.items() if key not in IGNORED_OPTIONS and value is not None}
+    succeeded = failed = 0
+    with open(results_path, "w") as results_file:
+        for number, row in iter_jobs(jobs_path):
+            result = {"row": number}
+            try:
+                options = {**defaults, **_parse_row(row)}
+                result[KEY_PATH] = options.get(KEY_PATH)
+                if output_path := options.get(KEY_OUTPUT_PATH):
+                    Path(output_path).mkdir(parents=True, exist_ok=True)
+                images = iter_process_images(**options)
+                result.update(status="ok", outputs=list(iter_save_copies(images, **options)))
+                succeeded += 1
+            except Exception as error:  # a bad row shouldn't stop the rest of the file
+                result.setdefault(KEY_PATH, _get_raw_path(row))
+                result.update(status="error", error=f"{type(error).__name__}: {error}")
+                failed += 1
+            results_file.write(json.dumps(result) + "\n")
+            results_file.flush()
+    return succeeded, failed
+
+
+def iter_jobs(jobs_path: str) -> Iterator[tuple]:
+    """
+    Streams the rows of a job file. Files ending in .csv are read as CSV
+    with a header row. Anything else is read as JSON Lines (i.e. a JSON
+    object per line). Blank lines and empty cells are skipped. A line that
+    isn't valid JSON is yielded as is, so it's reported as an error.
+
+    :param jobs_path: the path to a job file
+    :return: an iterator over (row number, row) tuples, numbered from 1
+    """
+    with open(jobs_path, newline="") as jobs_file:
+        if Path(jobs_path).suffix.lower() == ".csv":
+            for number, row in enumerate(csv.DictReader(jobs_file), start=1):
+                yield number, {key: value for key, value in row.items() if value not in (None, "")}
+        else:
+            for number, line in enumerate(jobs_file, start=1):
+                if line.strip():
+                    yield number, line
+
+
+def get_results_path(jobs_path: str) -> str:
+    """
+    Gets the default results file of a job file, which sits beside it.
+
+    :param jobs_path: the path to a job file
+    :return: the path to the results file (e.g. jobs-results.jsonl for jobs.csv)
+    """
+    path = Path(jobs_path)
+    return str(path.with_name(f"{path.stem}-results.jsonl"))
+
+
+def _get_raw_path(row) -> Optional[str]:
+    """
+    A helper function which gets the path of a row as written, even if the row is invalid.
+
+    :param row: a dictionary of column names to values, or a line of JSON
+    :return: the path of the row, or None if there isn't one
+    """
+    if isinstance(row, str):
+        try:
+            row = json.loads(row)
+        except ValueError:
+            return None
+    return row.get(KEY_PATH) if isinstance(row, dict) else None
+
+
+def _parse_row(row) -> dict:
+    """
+    A helper function which converts a row of a job file into a set of options.
+    Comma-separated sizes and tiers are split into lists (see get_variants).
+
+    :param row: a dictionary of column names to values, or a line of JSON
+    :raises ValueError: if the row isn't a JSON object, or an option is unknown or invalid
+    :return: a dictionary of options
+    """
+    if isinstance(row, str):
+        row = json.loads(row)
+        if not isinstance(row, dict):
+            raise ValueError("each line must be a JSON object")
+    options = dict()
+    for key, value in row.items():
+        key = ROW_ALIASES.get(key, key)
+        if key not in ROW_OPTIONS:
+            raise ValueError(f"unknown option: {key!r}")
+        if value is None:
+            continue
+        if key in CHOICE_OPTIONS:
+            values = [value]
+            if key in LIST_OPTIONS and isinstance(value, (str, list)):
+                values = [choice.strip() for choice in value.split(",")] if isinstance(value, str) else value
+            for choice in values:
+                if choice not in CHOICE_OPTIONS[key]:
+                    raise ValueError(f"invalid {key}: {choice!r} (choose from {', '.join(map(repr, CHOICE_OPTIONS[key]))})")
+            value = values if len(values) > 1 else values[0]
+        elif key == KEY_NO_TITLE and isinstance(value, str):
+            value = value.lower() not in ("", "0", "false")
+        options[key] = value
+    if not options.get(KEY_PATH):
+        raise ValueError("every row needs a path")
+    return options
@@ -0,0 +1,136 @@
+"""
+The bookkeeping behind incremental batches. A manifest remembers which
+inputs were rendered into an output directory and with which options,
+so unchanged inputs can be skipped on the next run.
+"""
+import hashlib
+import json
+from typing import Optional
+
+from . import __version__
+from imagetitler.constants import *
+from imagetitler.variants import get_variants
+
+IGNORED_OPTIONS = {KEY_BATCH, KEY_PATH, KEY_OUTPUT_PATH, KEY_JOBS, KEY_INCREMENTAL, KEY_MANIFEST,
+                   KEY_PROFILE, KEY_PROFILER, KEY_PIPELINE,
+                   KEY_RECURSIVE, KEY_INCLUDE, KEY_EXCLUDE, KEY_JOBS_FILE, KEY_RESULTS_FILE}
+TRACKED_FILE_OPTIONS = {KEY_FONT, KEY_LOGO_PATH}
+
+
+class Manifest:
+    """
+    A record of the images rendered into an output directory. Each entry is keyed
+    by the absolute input path and stores the size and modification time of the
+    input, a hash of the options and tool version used, and the resulting output
+    paths (one per variant). Counts are kept per input, not per output.
+    """
+
+    def __init__(self, output_path: Optional[str] = None):
+        self.path: str = os.path.join(output_path or "", MANIFEST_FILE_NAME)
+        self.entries: dict = dict()
+        self.rendered: int = 0
+        self.skipped: int = 0
+        self.recorded: set = set()
+        try:
+            with open(self.path) as manifest_file:
+                self.entries = json.load(manifest_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+    def is_up_to_date(self, input_path: str, **kwargs) -> bool:
+        """
+        Checks whether an input was already rendered with the same options
+        and hasn't changed since, and whether every one of its outputs (i.e.
+        one per variant) still exists. Up-to-date inputs are counted as skipped.
+
+        :param input_path: the path to an input image
+        :param kwargs: a set of options
+        :return: True if the input can be skipped
+        """
+        entry = self.entries.get(os.path.abspath(input_path))
+        outputs = entry.get("outputs") if entry else None
+        up_to_date = (
+            isinstance(outputs, list)
+            and entry == {**_get_fingerprint(input_path, **kwargs), "outputs": outputs}
+            and len(outputs) == len(get_variants(**kwargs))
+            and all(os.path.exists(output) for output in outputs)
+        )
+        if up_to_date:
+            self.skipped += 1
+        return up_to_date
+
+    def record(self, input_path: str, storage_path: str, **kwargs) -> None:
+        """
+        Records that an input was rendered to the given storage path. The
+        first output recorded for an input in this run replaces its entry,
+        and the rest (i.e. the other variants) are added to it.
+
+        :param input_path: the path to an input image
+        :param storage_path: the path of the rendered image
+        :param kwargs: a set of options
+        :return: None
+        """
+        key = os.path.abspath(input_path)
+        if key in self.recorded:
+            self.entries[key]["outputs"].append(storage_path)
+            return
+        self.entries[key] = {
+            **_get_fingerprint(input_path, **kwargs),
+            "outputs": [storage_path]
+        }
+        self.recorded.add(key)
+        self.rendered += 1
+
+    def save(self) -> None:
+        """
+        Writes the manifest to the output directory. The file is replaced
+        atomically, so an interrupted run never leaves a corrupt manifest.
+
+        :return: None
+        """
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as manifest_file:
+            json.dump(self.entries, manifest_file, indent=2, sort_keys=True)
+        os.replace(temporary_path, self.path)
+
+    def summary(self) -> str:
+        """
+        Describes how many images were rendered and skipped.
+
+        :return: a summary string (e.g. "Rendered 3 image(s), skipped 10 up-to-date image(s)")
+        """
+        return f"Rendered {self.rendered} image(s), skipped {self.skipped} up-to-date image(s)"
+
+
+def _get_fingerprint(input_path: str, **kwargs) -> dict:
+    """
+    A helper function which identifies the state of an input and the options it's rendered with.
+
+    :param input_path: the path to an input image
+    :param kwargs: a set of options
+    :return: a dictionary of the input size, modification time, and options hash
+    """
+    stat = os.stat(input_path)
+    return {
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "options": _get_options_hash(**kwargs)
+    }
+
+
+def _get_options_hash(**kwargs) -> str:
+    """
+    A helper function which hashes the options that affect the rendered image,
+    along with the tool version. Option files (i.e. fonts and logos) contribute
+    their size and modification time, so editing a logo invalidates its outputs.
+
+    :param kwargs: a set of options
+    :return: a hex digest of the options
+    """
+    options = {key: value for key, value in kwargs.items() if key not in IGNORED_OPTIONS}
+    for key in TRACKED_FILE_OPTIONS:
+        if (path := options.get(key)) and os.path.isfile(path):
+            stat = os.stat(path)
+            options[f"{key}_stat"] = (stat.st_size, stat.st_mtime_ns)
+    options["version"] = __version__
+    return hashlib.sha256(json.dumps(options, sort_keys=True, default=str).encode()).hexdigest()
@@ -0,0 +1,40 @@
+"""
+A small helper for spreading work across processes (or threads) without
+holding every result in memory at once.
+"""
+from collections import deque
+from typing import Callable, Iterable, Iterator
+
+
+def imap(function: Callable, *iterables: Iterable, jobs: int = 1, threads: bool = False) -> Iterator:
+    """
+    Lazily maps a function over a set of iterables, like the builtin map.
+    When more than one job is requested, the calls are run in a process
+    pool (or a thread pool). Results are always yielded in input order,
+    and at most two calls per job are in flight at any time, so memory use
+    stays bounded regardless of how many items there are.
+
+    Since the iterables are consumed lazily, chaining calls to imap forms
+    a pipeline: each stage runs in its own pool and overlaps with the
+    others, with the in-flight calls acting as a bounded queue in between.
+
+    :param function: a function (which must be picklable unless threads are used)
+    :param iterables: the arguments to the function
+    :param jobs: the number of processes (or threads) to use
+    :param threads: True to use a thread pool instead of a process pool
+    :return: an iterator over the results
+    """
+    if jobs <= 1 and not threads:
+        yield from map(function, *iterables)
+        return
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor  # deferred, since serial runs never need them
+    pool = ThreadPoolExecutor if threads else ProcessPoolExecutor
+    jobs = max(jobs, 1)
+    with pool(max_workers=jobs) as executor:
+        pending = deque()
+        for args in zip(*iterables):
+            pending.append(executor.submit(function, *args))
+            if len(pending) >= jobs * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
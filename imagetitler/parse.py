@@ -1,4 +1,5 @@
 import argparse
+from typing import Callable, Iterable, List, Union
 
 from imagetitler.constants import *
 
@@ -18,10 +19,72 @@ def parse_input() -> argparse.Namespace:
     _add_batch_option(parser)
     _add_font_option(parser)
     _add_custom_size_option(parser)
+    _add_jobs_option(parser)
+    _add_max_pixels_option(parser)
+    _add_incremental_option(parser)
+    _add_profile_option(parser)
+    _add_format_option(parser)
+    _add_encoder_option(parser)
+    _add_pipeline_option(parser)
+    _add_discovery_options(parser)
+    _add_jobs_file_options(parser)
     args = parser.parse_args()
+    if args.jobs_file and args.incremental:
+        parser.error(f"--{KEY_INCREMENTAL} can't be used with --{KEY_JOBS_FILE}")
     return args
 
 
+def parse_serve_input() -> argparse.Namespace:
+    """
+    Parses the command line input of the render service.
+
+    :return: the processed command line arguments
+    """
+    parser = argparse.ArgumentParser()
+    _add_serve_options(parser)
+    args = parser.parse_args()
+    return args
+
+
+def _choice_list(choices: Iterable[str]) -> Callable[[str], Union[str, List[str]]]:
+    """
+    A helper function which creates an argument type for a choice, or a comma-separated
+    list of choices (e.g. "DEV,Twitter"). Lists turn on variant mode (see get_variants).
+
+    :param choices: the valid choices
+    :return: a function which parses an argument into a choice or a list of choices
+    """
+    choices = list(choices)
+
+    def parse_choices(argument: str) -> Union[str, List[str]]:
+        values = [value.strip() for value in argument.split(",")]
+        for value in values:
+            if value not in choices:
+                raise argparse.ArgumentTypeError(
+                    f"invalid choice: {value!r} (choose from {', '.join(map(repr, choices))})"
+                )
+        return values if len(values) > 1 else values[0]
+
+    return parse_choices
+
+
+def _positive_int(argument: str) -> int:
+    """
+    A helper function which parses an argument as a positive integer (e.g. a number of jobs).
+
+    :param argument: the argument
+    :raises argparse.ArgumentTypeError: if the argument isn't a positive integer
+    :return: the integer
+    """
+    try:
+        value = int(argument)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"invalid positive integer: {argument!r}")
+    return value
+
+
 def _add_title_option(parser: argparse.ArgumentParser) -> None:
     """
     A helper function which sets up the title settings for the parser.
@@ -84,8 +147,9 @@ def _add_tier_option(parser: argparse.ArgumentParser) -> None:
     parser.add_argument(
         '-r',
         f'--{KEY_TIER}',
-        choices=TIER_MAP.keys(),
-        help="select an image tier"
+        type=_choice_list(TIER_MAP.keys()),
+        metavar="{" + ",".join(TIER_MAP) + "}",
+        help="select an image tier (or a comma-separated list of tiers to render a variant of each)"
     )
 
 
@@ -148,6 +212,209 @@ def _add_custom_size_option(parser: argparse.ArgumentParser) -> None:
     parser.add_argument(
         "-s",
         f'--{KEY_SIZE}',
-        choices=SIZE_MAP.keys(),  # [f'{k} {v}' for k, v in SIZE_MAP.items()]
-        help="change the default size of the output image"
+        type=_choice_list(SIZE_MAP.keys()),  # [f'{k} {v}' for k, v in SIZE_MAP.items()]
+        metavar="{" + ",".join(SIZE_MAP) + "}",
+        help="change the default size of the output image (or a comma-separated list of sizes to render a variant of each)"
+    )
+
+
+def _add_jobs_option(parser: argparse.ArgumentParser) -> None:
+    """
+    A helper function which sets up the jobs setting for the parser.
+    The jobs setting determines how many processes share a batch.
+
+    :param parser: an argument parser
+    :return: None
+    """
+    parser.add_argument(
+        "-j",
+        f'--{KEY_JOBS}',
+        type=_positive_int,
+        default=DEFAULT_JOBS,
+        help="set the number of processes used in batch mode (defaults to the number of available cores)"
+    )
+
+
+def _add_max_pixels_option(parser: argparse.ArgumentParser) -> None:
+    """
+    A helper function which sets up the max pixels setting for the parser.
+    The max pixels setting caps how many pixels may be decoded from an input image.
+
+    :param parser: an argument parser
+    :return: None
+    """
+    parser.add_argument(
+        f'--{KEY_MAX_PIXELS}',
+        type=_positive_int,
+        default=DEFAULT_MAX_PIXELS,
+        help="set the maximum number of pixels decoded from an input image"
+    )
+
+
+def _add_incremental_option(parser: argparse.ArgumentParser) -> None:
+    """
+    A helper function which sets up the incremental setting for the parser.
+    The incremental setting skips batch images whose output is up to date.
+
+    :param parser: an argument parser
+    :return: None
+    """
+    parser.add_argument(
+        '-i',
+        f'--{KEY_INCREMENTAL}',
+        action='store_true',
+        help="skip batch images that haven't changed since they were last processed"
+    )
+
+
+def _add_profile_option(parser: argparse.ArgumentParser) -> None:
+    """
+    A helper function which sets up the profile setting for the parser.
+    The profile setting writes a report of how long each stage took.
+
+    :param parser: an argument parser
+    :return: None
+    """
+    parser.add_argument(
+        f'--{KEY_PROFILE}',
+        metavar="REPORT_PATH",
+        help="write per-image and aggregate stage timings to a JSON report"
+    )
+
+
+def _add_format_option(parser: argparse.ArgumentParser) -> None:
+    """
+    A helper function which sets up the format setting for the parser.
+    The format setting overrides the format of the input image.
+
+    :param parser: an argument parser
+    :return: None
+    """
+    parser.add_argument(
+        f'--{KEY_FORMAT}',
+        choices=FORMAT_MAP.keys(),
+        help="change the format of the output image (defaults to the format of the input image)"
+    )
+
+
+def _add_encoder_option(parser: argparse.ArgumentParser) -> None:
+    """
+    A helper function which sets up the encoder setting for the parser.
+    The encoder setting trades output size against encoding time and quality.
+
+    :param parser: an argument parser
+    :return: None
+    """
+    parser.add_argument(
+        '-e',
+        f'--{KEY_ENCODER}',
+        choices=ENCODER_MAP.keys(),
+        help=f"select an encoder profile (defaults to {DEFAULT_ENCODER})"
+    )
+
+
+def _add_pipeline_option(parser: argparse.ArgumentParser) -> None:
+    """
+    A helper function which sets up the pipeline setting for the parser.
+    The pipeline setting runs batches on threads, with reading, rendering,
+    encoding, and writing each overlapping in a pool of their own.
+
+    :param parser: an argument parser
+    :return: None
+    """
+    parser.add_argument(
+        f'--{KEY_PIPELINE}',
+        action='store_true',
+        help="overlap reading, rendering, encoding, and writing across thread pools instead of using processes"
+    )
+
+
+def _add_discovery_options(parser: argparse.ArgumentParser) -> None:
+    """
+    A helper function which sets up the settings that pick the images of a batch.
+    The recursive setting searches subdirectories as well, while the include and
+    exclude settings filter images by glob patterns.
+
+    :param parser: an argument parser
+    :return: None
+    """
+    parser.add_argument(
+        f'--{KEY_RECURSIVE}',
+        action='store_true',
+        help="search subdirectories of the batch as well, mirroring them in the output path"
+    )
+    parser.add_argument(
+        f'--{KEY_INCLUDE}',
+        action='append',
+        metavar="PATTERN",
+        help="only process batch images matching this glob pattern (e.g. \"*.png\"), can be repeated"
+    )
+    parser.add_argument(
+        f'--{KEY_EXCLUDE}',
+        action='append',
+        metavar="PATTERN",
+        help="skip batch images and directories matching this glob pattern (e.g. \"drafts\"), can be repeated"
+    )
+
+
+def _add_jobs_file_options(parser: argparse.ArgumentParser) -> None:
+    """
+    A helper function which sets up the job file settings for the parser.
+    The jobs file setting renders a row of options per image from a JSONL
+    or CSV file, and the results file setting determines where the outcome
+    of each row is written.
+
+    :param parser: an argument parser
+    :return: None
+    """
+    parser.add_argument(
+        f'--{KEY_JOBS_FILE}',
+        '--jobs-file',
+        metavar="JOBS_PATH",
+        help="render an image per row of a JSONL or CSV file (with columns like path, title, tier, size, logo, font, and output)"
+    )
+    parser.add_argument(
+        f'--{KEY_RESULTS_FILE}',
+        metavar="RESULTS_PATH",
+        help="write the outcome of each row of the jobs file to this file (defaults to {jobs file name}-results.jsonl)"
+    )
+
+
+def _add_serve_options(parser: argparse.ArgumentParser) -> None:
+    """
+    A helper function which sets up the render service settings for the parser.
+    The host and port settings determine where the service listens, the
+    jobs setting determines how many requests are rendered at once, and the
+    cache settings determine where and how many rendered images are kept.
+
+    :param parser: an argument parser
+    :return: None
+    """
+    parser.add_argument(
+        f'--{KEY_HOST}',
+        default=DEFAULT_HOST,
+        help="set the address the service listens on (defaults to localhost only)"
+    )
+    parser.add_argument(
+        f'--{KEY_PORT}',
+        type=int,
+        default=DEFAULT_PORT,
+        help="set the port the service listens on"
+    )
+    parser.add_argument(
+        "-j",
+        f'--{KEY_JOBS}',
+        type=_positive_int,
+        default=DEFAULT_JOBS,
+        help="set the number of requests rendered at once (defaults to the number of available cores)"
+    )
+    parser.add_argument(
+        f'--{KEY_CACHE_DIR}',
+        help="keep rendered images in a directory, so repeated requests are served without rendering"
+    )
+    parser.add_argument(
+        f'--{KEY_CACHE_SIZE}',
+        type=int,
+        default=DEFAULT_CACHE_SIZE,
+        help="set the maximum size of the cache directory in megabytes"
     )
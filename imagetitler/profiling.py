@@ -0,0 +1,198 @@
+"""
+Lightweight timing hooks for the rendering and saving stages. Stages are
+marked with the stage context manager, which does nothing unless a record
+is active, so the hooks cost next to nothing when profiling is off.
+"""
+import json
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+PERCENTILES = (50, 90, 95, 99)
+
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("timings", default=None)
+
+
+class _Stage:
+    """
+    Times a single stage and adds the result to a record.
+    """
+    __slots__ = ("name", "timings", "start")
+
+    def __init__(self, name: str, timings: Dict[str, float]):
+        self.name = name
+        self.timings = timings
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *_):
+        self.timings[self.name] = self.timings.get(self.name, 0.0) + time.perf_counter() - self.start
+
+
+class _NoStage:
+    """
+    Stands in for a stage when no record is active.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *_):
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name: str):
+    """
+    Marks a stage of work (e.g. "decode" or "encode"). When a record is
+    active, the time spent in the stage is added to it. Otherwise, this
+    is a no-op.
+
+    :param name: the name of the stage
+    :return: a context manager around the stage
+    """
+    timings = _timings.get()
+    if timings is None:
+        return _NO_STAGE
+    return _Stage(name, timings)
+
+
+@contextmanager
+def record(enabled: bool = True) -> Iterator[Optional[Dict[str, float]]]:
+    """
+    Records the stages run within the context (in this thread or process).
+
+    :param enabled: False to skip recording entirely
+    :return: a context manager yielding a dictionary of stage names to seconds (or None if disabled)
+    """
+    if not enabled:
+        yield None
+        return
+    timings = dict()
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def call(function: Callable, *args, **kwargs) -> tuple:
+    """
+    Calls a function while recording its stages. This is picklable when the
+    function is, so it can wrap work that's handed to a process pool.
+
+    :param function: the function to call
+    :param args: the positional arguments of the function
+    :param kwargs: the keyword arguments of the function
+    :return: a tuple of the result and the recorded stage timings
+    """
+    with record() as timings:
+        return function(*args, **kwargs), timings
+
+
+def profiled(function: Callable, profiler: Optional["Profiler"]) -> Callable:
+    """
+    Wraps a function so its calls return their stage timings (see call),
+    but only when there's a profiler to collect them.
+
+    :param function: the function to wrap
+    :param profiler: a profiler or None
+    :return: the wrapped function or the function itself
+    """
+    return partial(call, function) if profiler else function
+
+
+def collect(results: Iterable, keys: Union[Iterable[str], Callable], profiler: Optional["Profiler"]) -> Iterator:
+    """
+    Unwraps the results of a profiled function (see profiled), adding each
+    set of stage timings to the profiler under the matching key. Keys are
+    only drawn once their result is ready.
+
+    :param results: the results of a profiled function
+    :param keys: the key (i.e. input path) of each result, or a function which gets the key from a result
+    :param profiler: a profiler or None
+    :return: an iterator over the unwrapped results
+    """
+    if not profiler:
+        yield from results
+        return
+    remaining = None if callable(keys) else iter(keys)
+    for result, timings in results:
+        profiler.add(keys(result) if remaining is None else next(remaining), timings)
+        yield result
+
+
+class Profiler:
+    """
+    Collects the stage timings of every image in a run and summarizes them.
+    Images are keyed by their input path. Timings for the same image (e.g.
+    from rendering and then saving) are merged.
+    """
+
+    def __init__(self):
+        self.images: Dict[str, Dict[str, float]] = dict()
+        self.start: float = time.perf_counter()
+
+    def add(self, image: str, timings: Dict[str, float]) -> None:
+        """
+        Adds the stage timings of an image.
+
+        :param image: the input path of the image
+        :param timings: a dictionary of stage names to seconds
+        :return: None
+        """
+        image_timings = self.images.setdefault(image, dict())
+        for name, seconds in timings.items():
+            image_timings[name] = image_timings.get(name, 0.0) + seconds
+
+    def report(self) -> dict:
+        """
+        Summarizes the timings as a per-image breakdown and per-stage
+        aggregates (count, total, mean, percentiles, and max). The "total"
+        stage is the sum of every stage of an image.
+
+        :return: the report as a dictionary
+        """
+        images = {image: {**timings, "total": sum(timings.values())} for image, timings in self.images.items()}
+        stages = dict()
+        for timings in images.values():
+            for name, seconds in timings.items():
+                stages.setdefault(name, list()).append(seconds)
+        return {
+            "elapsed": time.perf_counter() - self.start,
+            "images": images,
+            "stages": {name: _summarize(times) for name, times in stages.items()}
+        }
+
+    def save(self, path: str) -> None:
+        """
+        Writes the report to a JSON file.
+
+        :param path: the path of the report file
+        :return: None
+        """
+        with open(path, "w") as report_file:
+            json.dump(self.report(), report_file, indent=2)
+
+
+def _summarize(times: List[float]) -> dict:
+    """
+    A helper function which aggregates the timings of a stage.
+
+    :param times: the timings of a stage in seconds
+    :return: a dictionary of statistics
+    """
+    times = sorted(times)
+    summary = {"count": len(times), "total": sum(times), "mean": sum(times) / len(times), "min": times[0]}
+    for percent in PERCENTILES:
+        summary[f"p{percent}"] = times[max(math.ceil(percent / 100 * len(times)) - 1, 0)]  # nearest rank
+    summary["max"] = times[-1]
+    return summary
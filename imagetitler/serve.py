@@ -0,0 +1,230 @@
+"""
+A small HTTP service for rendering images without paying for startup on
+every call. Requests are rendered by a bounded pool of threads within a
+single process, so fonts, prepared logos, and title layouts stay cached
+from one request to the next.
+
+An image is rendered by posting its contents, with the options in the
+query string (e.g. POST /?title=Hello+World&tier=premium&size=YouTube).
+The response holds the encoded image, and its file name is given in the
+Content-Disposition header. Repeated requests are answered from a render
+cache (see RenderCache) without rendering anything.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs, quote, urlsplit
+
+from PIL import Image
+
+from imagetitler import __version__
+from imagetitler.cache import RenderCache, get_cache_key
+from imagetitler.constants import *
+from imagetitler.draw import process_image_data, process_images
+from imagetitler.store import encode_image
+
+MAX_UPLOAD_BYTES = 64 * 1024 * 1024
+REQUEST_TIMEOUT = 30  # seconds a client may take to send its request
+
+CHOICE_OPTIONS = {KEY_TIER: TIER_MAP, KEY_SIZE: SIZE_MAP, KEY_FORMAT: FORMAT_MAP, KEY_ENCODER: ENCODER_MAP}
+FILE_OPTIONS = (KEY_LOGO_PATH, KEY_FONT)
+TEXT_OPTIONS = (KEY_TITLE, "filename")
+FLAG_OPTIONS = (KEY_NO_TITLE,)
+
+
+class RenderServer(HTTPServer):
+    """
+    An HTTP server which handles each request on a bounded thread pool.
+    At most two requests per job are accepted at once. The rest wait in
+    the listen backlog, so a burst of uploads can't exhaust memory. Every
+    request shares the same render cache.
+    """
+
+    def __init__(self, address: tuple, jobs: int = DEFAULT_JOBS, cache: Optional[RenderCache] = None):
+        super().__init__(address, RenderRequestHandler)
+        self.cache = cache if cache is not None else RenderCache()
+        jobs = max(jobs, 1)
+        self.executor = ThreadPoolExecutor(max_workers=jobs)
+        self.slots = threading.BoundedSemaphore(jobs * 2)
+
+    def process_request(self, request, client_address) -> None:
+        """
+        Hands a request to the thread pool, once there's room for it.
+
+        :param request: the client socket
+        :param client_address: the address of the client
+        :return: None
+        """
+        self.slots.acquire()
+        self.executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address) -> None:
+        """
+        Handles a request on a worker thread (see socketserver.ThreadingMixIn).
+
+        :param request: the client socket
+        :param client_address: the address of the client
+        :return: None
+        """
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def server_close(self) -> None:
+        """
+        Stops listening, then waits for the requests in flight to finish.
+
+        :return: None
+        """
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """
+    Renders the image posted with each request. GET requests serve as a health check.
+    """
+    server_version = f"image-titler/{__version__}"
+    timeout = REQUEST_TIMEOUT
+
+    def do_GET(self) -> None:
+        """
+        Reports that the service is up.
+
+        :return: None
+        """
+        self._send(HTTPStatus.OK, b"ok\n", "text/plain")
+
+    def do_POST(self) -> None:
+        """
+        Renders the posted image with the options from the query string.
+
+        :return: None
+        """
+        try:
+            options = parse_options(urlsplit(self.path).query)
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError as error:
+            self.send_error(HTTPStatus.BAD_REQUEST, str(error))
+            return
+        if length <= 0:
+            self.send_error(HTTPStatus.LENGTH_REQUIRED, "the request must contain an image")
+            return
+        if length > MAX_UPLOAD_BYTES:
+            self.send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"images are limited to {MAX_UPLOAD_BYTES} bytes")
+            return
+        image_data = self.rfile.read(length)
+        try:
+            file_name, encoded = render(image_data, **options, cache=self.server.cache)
+        except (ValueError, OSError) as error:  # e.g. an unreadable image or one over the pixel budget
+            self.send_error(HTTPStatus.BAD_REQUEST, str(error))
+            return
+        except Exception as error:  # anything else is a bug, but the client still deserves a response
+            self.log_error("failed to render %s: %r", self.path, error)
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, type(error).__name__)
+            return
+        content_type = Image.MIME.get(Image.registered_extensions().get(Path(file_name).suffix.lower()))
+        self._send(HTTPStatus.OK, encoded, content_type or "application/octet-stream", file_name)
+
+    def _send(self, status: HTTPStatus, body: bytes, content_type: str, file_name: str = "") -> None:
+        """
+        A helper function which sends a complete response.
+
+        :param status: the status of the response
+        :param body: the body of the response
+        :param content_type: the media type of the body
+        :param file_name: the file name of the body, if it's an attachment
+        :return: None
+        """
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if file_name:
+            self.send_header("Content-Disposition", get_content_disposition(file_name))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def parse_options(query: str) -> dict:
+    """
+    Converts the query string of a request into a set of options. Only
+    the options that make sense for a single image are accepted (e.g.
+    title, tier, size, logo_path, font, format, and encoder). The filename
+    option stands in for the name of the uploaded file, and is reduced to a
+    safe file name, since the output is named after it.
+
+    :param query: the query string (e.g. "title=Hello+World&tier=free")
+    :raises ValueError: if an option is unknown, repeated, or invalid
+    :return: a dictionary of options
+    """
+    options = dict()
+    for key, values in parse_qs(query, keep_blank_values=True, strict_parsing=bool(query)).items():
+        if len(values) > 1:
+            raise ValueError(f"{key} was given more than once")
+        value = values[0]
+        if key in CHOICE_OPTIONS:
+            if value not in CHOICE_OPTIONS[key]:
+                raise ValueError(f"invalid {key}: {value!r} (choose from {', '.join(map(repr, CHOICE_OPTIONS[key]))})")
+        elif key in FILE_OPTIONS:
+            if not Path(value).is_file():
+                raise ValueError(f"{key} does not exist: {value!r}")
+        elif key in FLAG_OPTIONS:
+            value = value.lower() not in ("", "0", "false")
+        elif key == "filename":
+            import pathvalidate  # deferred, since it's slow to import
+            value = pathvalidate.sanitize_filename(Path(value).name)
+        elif key not in TEXT_OPTIONS:
+            raise ValueError(f"unknown option: {key!r}")
+        options[KEY_PATH if key == "filename" else key] = value
+    return options
+
+
+def get_content_disposition(file_name: str) -> str:
+    """
+    Builds the Content-Disposition header of an attachment. The file name is
+    given twice: as a plain ASCII fallback with anything unsafe replaced, and
+    percent-encoded in full (see RFC 6266), so no file name can break the header.
+
+    :param file_name: the file name of the attachment
+    :return: the value of the header (e.g. attachment; filename="a.jpg"; filename*=UTF-8''a.jpg)
+    """
+    fallback = "".join(char if " " <= char <= "~" and char not in '"\\' else "_" for char in file_name)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(file_name)}"
+
+
+def render(image_data: bytes, **kwargs) -> tuple:
+    """
+    Renders and encodes a single image. When a cache is provided, a render
+    that's been done before is returned straight from the cache.
+
+    :param image_data: the contents of the input image file
+    :param kwargs: a set of options (see parse_options)
+    :return: a tuple of the file name and the encoded image
+    """
+    cache = kwargs.pop(KEY_CACHE, None)
+    if cache:
+        key = get_cache_key(image_data, **kwargs)
+        if entry := cache.get(key):
+            return entry
+    edited_image = process_image_data(image_data, **kwargs)[0]
+    file_name, encoded = encode_image(edited_image, **kwargs)
+    if cache:
+        cache.put(key, file_name, encoded)
+    return file_name, encoded
+
+
+def warm_up() -> None:
+    """
+    Renders and encodes the default image once, so the first request
+    doesn't pay for deferred imports and loading the default font.
+
+    :return: None
+    """
+    encode_image(process_images()[0])
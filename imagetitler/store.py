@@ -1,13 +1,16 @@
+import io
+from itertools import count, islice
 from pathlib import Path
-from typing import List
+from typing import List, Iterable, Iterator, BinaryIO, Union
 
-import pathvalidate
-import piexif
-import piexif.helper
 from PIL import Image
 
 from . import __version__
 from imagetitler.constants import *
+from imagetitler.exif import add_user_comment, create_exif
+from imagetitler.parallel import imap
+from imagetitler.profiling import collect, profiled, record, stage
+from imagetitler.variants import get_variants
 
 
 def save_copies(edited_images: List[Image.Image], **kwargs) -> List[str]:
@@ -25,40 +28,212 @@ def save_copies(edited_images: List[Image.Image], **kwargs) -> List[str]:
 
     {title}-featured-image-{software version}.{extension}
 
+    In variant mode, the variant tag follows the title (e.g. {title}-dev-premium-...).
+
+    When more than one job is requested, the images are encoded and written
+    across a process pool.
+
     :param edited_images: a list of edited images
     :param kwargs: a set of keyword arguments (see parse_input for options)
     :return: a list of storage paths
     """
-    storage_paths = list()
-    if not kwargs.get(KEY_BATCH):  # batch must be turned on to process multiple images
-        edited_images = edited_images[:1]
+    image_count = len(edited_images)
+    if not kwargs.get(KEY_BATCH):  # only the variants of the first image are saved
+        image_count = min(image_count, len(get_variants(**kwargs)))
+    jobs = min(kwargs.get(KEY_JOBS) or DEFAULT_JOBS, image_count)
+    return list(iter_save_copies(edited_images, **{**kwargs, KEY_JOBS: jobs}))
+
+
+def iter_save_copies(edited_images: Iterable[Image.Image], **kwargs) -> Iterator[str]:
+    """
+    The streaming version of save_copies. Images are pulled from the iterable,
+    encoded, and written one at a time, and each storage path is yielded as
+    soon as its file exists. Paired with iter_process_images, this keeps memory
+    use flat regardless of the size of the batch. When a manifest is provided,
+    each saved image is recorded in it, and the manifest is written at the end.
+    When a profiler is provided, the stage timings of each image are added to it.
+
+    :param edited_images: an iterable of edited images (e.g. iter_process_images)
+    :param kwargs: a set of keyword arguments (see parse_input for options)
+    :return: an iterator over the storage paths
+    """
+    jobs = kwargs.get(KEY_JOBS) or DEFAULT_JOBS
+    if not kwargs.get(KEY_BATCH):  # batch must be turned on to process multiple images (other than variants)
+        edited_images = islice(edited_images, len(get_variants(**kwargs)))
+        jobs = 1
+    manifest = kwargs.get(KEY_MANIFEST)
+    profiler = kwargs.get(KEY_PROFILER)
+    saved = list()
+    saves = _prepare_saves(edited_images, saved, **kwargs)
+    if kwargs.get(KEY_PIPELINE):
+        encoded = imap(profiled(_encode_image, profiler), saves, jobs=jobs, threads=True)
+        encoded = collect(encoded, _iter_profile_keys(saved), profiler)
+        results = imap(profiled(_write_file, profiler), encoded, jobs=jobs, threads=True)
+    else:
+        results = imap(profiled(_save_image, profiler), saves, jobs=jobs)
+    try:
+        for index, storage_path in enumerate(collect(results, _iter_profile_keys(saved), profiler)):
+            if manifest and (source := saved[index][1]):
+                manifest.record(source, storage_path, **kwargs)
+            yield storage_path
+    finally:
+        if manifest:
+            manifest.save()
+
+
+def encode_image(edited_image: Image.Image, **kwargs) -> tuple:
+    """
+    Encodes a single image in memory instead of saving it. The image is
+    encoded exactly as save_copies would save it, and given the same name.
+
+    :param edited_image: an edited image
+    :param kwargs: a set of keyword arguments (see parse_input for options)
+    :return: a tuple of the file name (e.g. hello-world-v2-5-1.jpg) and the encoded image
+    """
+    storage_path = _generate_image_output_path(edited_image, 0, **{**kwargs, KEY_OUTPUT_PATH: None})
+    save = (edited_image, storage_path, _generate_version_exif(edited_image), _get_save_options(storage_path, **kwargs))
+    return _encode_image(save)
+
+
+def _prepare_saves(edited_images: Iterable[Image.Image], saved: list, **kwargs) -> Iterator[tuple]:
+    """
+    Pairs each image with its storage path and exif data. The output path
+    depends on attributes (e.g. filename) that don't survive pickling, so
+    this has to happen before an image is handed to a worker.
+
+    :param edited_images: an iterable of edited images
+    :param saved: a list to be filled with the (storage path, input path) of each image, in order
+    :param kwargs: a set of options
+    :return: an iterator over (image, storage path, exif, save options) tuples
+    """
+    profiler = kwargs.get(KEY_PROFILER)
     for index, edited_image in enumerate(edited_images):
+        index = getattr(edited_image, "batch_index", index)
         storage_path = _generate_image_output_path(edited_image, index, **kwargs)
-        exif = _generate_version_exif(edited_image)
-        edited_image.save(storage_path, subsampling=0, quality=100, exif=exif)
-        storage_paths.append(storage_path)
-    return storage_paths
+        if getattr(edited_image, "batch_directory", ""):
+            Path(storage_path).parent.mkdir(parents=True, exist_ok=True)
+        source = getattr(edited_image, "filename", None)
+        saved.append((storage_path, source))
+        with record(enabled=profiler is not None) as timings:
+            with stage("exif"):
+                exif = _generate_version_exif(edited_image)
+        if profiler:
+            profiler.add(source or storage_path, timings)
+        yield edited_image, storage_path, exif, _get_save_options(storage_path, **kwargs)
+
+
+def _iter_profile_keys(saved: list) -> Iterator[str]:
+    """
+    Lists the key of each saved image for the profiler (i.e. its input path,
+    or its storage path if the input path is unknown). Keys are looked up
+    lazily, since the list is filled as images are prepared.
+
+    :param saved: the (storage path, input path) of each image (see _prepare_saves)
+    :return: an iterator over the keys
+    """
+    for index in count():
+        storage_path, source = saved[index]
+        yield source or storage_path
+
+
+def _save_image(save: tuple) -> str:
+    """
+    Encodes and writes a single image to disk.
+
+    :param save: an (image, storage path, exif, save options) tuple (see _prepare_saves)
+    :return: the storage path
+    """
+    storage_path = save[1]
+    with stage("encode"):
+        _encode(save, storage_path)
+    return storage_path
+
+
+def _encode_image(save: tuple) -> tuple:
+    """
+    Encodes a single image in memory, so it can be written by another thread.
+
+    :param save: an (image, storage path, exif, save options) tuple (see _prepare_saves)
+    :return: a tuple of the storage path and the encoded image
+    """
+    buffer = io.BytesIO()
+    with stage("encode"):
+        _encode(save, buffer)
+    return save[1], buffer.getvalue()
+
+
+def _write_file(encoded: tuple) -> str:
+    """
+    Writes an encoded image to disk.
+
+    :param encoded: a tuple of the storage path and the encoded image (see _encode_image)
+    :return: the storage path
+    """
+    storage_path, data = encoded
+    with stage("write"):
+        Path(storage_path).write_bytes(data)
+    return storage_path
+
+
+def _encode(save: tuple, output: Union[str, BinaryIO]) -> None:
+    """
+    A helper function which encodes an image in the format of its storage path.
+    Images with an alpha channel or a palette are converted to RGB first when
+    saved as a JPEG. The ICC profile of the input image, if any, is carried over.
+
+    :param save: an (image, storage path, exif, save options) tuple (see _prepare_saves)
+    :param output: the path or file object to write to
+    :return: None
+    """
+    edited_image, storage_path, exif, options = save
+    image_format = _get_format(storage_path)
+    if image_format == "JPEG" and edited_image.mode not in ("RGB", "L", "CMYK"):
+        edited_image = edited_image.convert("RGB")
+    if icc_profile := edited_image.info.get("icc_profile"):
+        options = {**options, "icc_profile": icc_profile}
+    edited_image.save(output, format=image_format or None, exif=exif, **options)
+
+
+def _get_save_options(storage_path: str, **kwargs) -> dict:
+    """
+    Gets the encoder settings for a storage path from the selected encoder profile.
+    Formats that the profile doesn't cover are saved with Pillow's defaults.
+
+    :param storage_path: the path of the file to be created
+    :param kwargs: a set of options
+    :return: a dictionary of save options (e.g. {"quality": 85})
+    """
+    profile = ENCODER_MAP[kwargs.get(KEY_ENCODER) or DEFAULT_ENCODER]
+    return profile.get(_get_format(storage_path), dict())
+
+
+def _get_format(storage_path: str) -> str:
+    """
+    Gets the Pillow format name of a storage path from its extension.
+
+    :param storage_path: the path of the file to be created
+    :return: the format name (e.g. "JPEG") or an empty string if the extension is unknown
+    """
+    return Image.registered_extensions().get(Path(storage_path).suffix.lower(), "")
 
 
 def _generate_version_exif(image: Image.Image) -> bytes:
     """
-    Given an image and version, this function will place that vision in the EXIF data of the file.
+    Given an image and version, this function will place that version in the EXIF data of the file.
 
-    Currently, this function is limited to files that already have EXIF data. Naturally, not
-    all files have EXIF data, so I'm not sure how useful this feature is. That said, titler's
-    a nice start!
+    The version is spliced into the UserComment field of any existing EXIF data, so the rest of
+    the metadata (e.g. orientation) is carried over untouched. Images without EXIF data are given
+    a minimal block that only holds the version, which is built once and reused.
 
     :param image: an image file
-    :return: the exif data as a byte string (empty string for images that didn't already have data)
+    :return: the exif data as a byte string
     """
-    exif_data = b""
     version: str = __version__
     version = version.replace(".", SEPARATOR)
+    comment = f'image-titler-v{version}'
     if exif := image.info.get('exif'):
-        exif_dict = piexif.load(exif)
-        exif_dict['Exif'][piexif.ExifIFD.UserComment] = piexif.helper.UserComment.dump(f'image-titler-v{version}')
-        exif_data = piexif.dump(exif_dict)
-    return exif_data
+        return add_user_comment(exif, comment)
+    return create_exif(comment)
 
 
 def _get_file_name(edited_image: Image.Image, **kwargs) -> str:
@@ -76,6 +251,7 @@ def _get_file_name(edited_image: Image.Image, **kwargs) -> str:
     :return: the file name without the extension (e.g. image-titler)
     """
     if title := kwargs.get(KEY_TITLE):
+        import pathvalidate  # deferred, since it's slow to import
         file_name = pathvalidate.sanitize_filename(title.lower().replace(" ", SEPARATOR))
     elif hasattr(edited_image, 'filename'):
         file_name = Path(edited_image.filename).stem
@@ -86,16 +262,20 @@ def _get_file_name(edited_image: Image.Image, **kwargs) -> str:
     return file_name
 
 
-def _get_extension(edited_image: Image.Image) -> str:
+def _get_extension(edited_image: Image.Image, **kwargs) -> str:
     """
-    Gets the extension for the new image.
+    Gets the extension for the new image. The format option takes
+    priority over the extension of the original file.
 
     :param edited_image: the edited image
+    :param kwargs: the set of options
     :return: the file extension with the dot (e.g. ".jpg")
     """
     extension = ".jpg"
-    if hasattr(edited_image, 'filename'):
-        extension = Path(edited_image.filename).suffix
+    if output_format := kwargs.get(KEY_FORMAT):
+        extension = FORMAT_MAP[output_format]
+    elif suffix := Path(getattr(edited_image, 'filename', "")).suffix:
+        extension = suffix
     return extension
 
 
@@ -115,6 +295,18 @@ def _get_index(index: int, **kwargs) -> str:
     return i
 
 
+def _get_variant(edited_image: Image.Image) -> str:
+    """
+    Gets the variant tag of an image (see get_variants) and places it in a string as follows: -{tag}
+
+    :param edited_image: the edited image
+    :return: a string in the form of a file name tag (e.g. -dev-premium) or an empty string
+    """
+    if tag := getattr(edited_image, "variant", ""):
+        return f'-{tag}'
+    return ""
+
+
 def _get_version() -> str:
     """
     Gets the version of the image-titler and places in a string as follows: -v{version}
@@ -145,7 +337,8 @@ def _generate_image_output_path(edited_image: Image.Image, index: int, **kwargs)
     A helper function which generates an image output path from an image and its options.
     If a title exists, this method will use the title as the file name.
     If the image has the filename attribute, that will be used instead.
-    Otherwise, a generic file name is created.
+    Otherwise, a generic file name is created. Images from a subdirectory
+    of a batch are stored in the same subdirectory of the output path.
 
     :param edited_image: an image to be stored
     :param index: the index of this image in a set
@@ -153,8 +346,11 @@ def _generate_image_output_path(edited_image: Image.Image, index: int, **kwargs)
     """
     version: str = _get_version()
     file_name = _get_file_name(edited_image, **kwargs)
-    extension = _get_extension(edited_image)
+    extension = _get_extension(edited_image, **kwargs)
     index = _get_index(index, **kwargs)
+    variant = _get_variant(edited_image)
     output_path = _get_output_path(**kwargs)
-    storage_path = f'{output_path}{file_name}{version}{index}{extension}'
+    if directory := getattr(edited_image, "batch_directory", ""):
+        output_path = f'{output_path}{Path(directory).as_posix()}/'
+    storage_path = f'{output_path}{file_name}{variant}{version}{index}{extension}'
     return storage_path
@@ -0,0 +1,47 @@
+"""
+Variant mode, where a list of sizes and/or tiers is rendered from each
+input image. Every variant is tagged (e.g. "dev-premium"), so its output
+file name is unique.
+"""
+from typing import List, NamedTuple, Optional
+
+from imagetitler.constants import *
+
+
+class Variant(NamedTuple):
+    """
+    A single combination of size and tier. The tag is empty outside of variant mode.
+    """
+    tag: str
+    size: Optional[str]
+    tier: Optional[str]
+
+
+def get_variants(**kwargs) -> List[Variant]:
+    """
+    Lists the variants to render for each input image. A size or tier option
+    that's a list (e.g. ["DEV", "Twitter"]) produces a variant per entry, and
+    contributes that entry to the tag. Variants are ordered by size, then tier.
+    Outside of variant mode, this is a single variant with an empty tag.
+
+    :param kwargs: a set of options
+    :return: a list of variants
+    """
+    sizes, tiers = kwargs.get(KEY_SIZE), kwargs.get(KEY_TIER)
+    variants = list()
+    for size in sizes if is_list(sizes) else [sizes]:
+        for tier in tiers if is_list(tiers) else [tiers]:
+            tag = [size.lower()] if is_list(sizes) else []
+            tag += [tier] if is_list(tiers) and tier else []
+            variants.append(Variant(SEPARATOR.join(tag), size, tier))
+    return variants
+
+
+def is_list(option) -> bool:
+    """
+    Checks whether an option holds a list of values (i.e. variant mode).
+
+    :param option: the value of an option
+    :return: True if the option is a list or tuple
+    """
+    return isinstance(option, (list, tuple))
@@ -2,31 +2,39 @@
 The commandline interface for the image-titler script.
 """
 
-import os
-import sys
-
-PROJECT_ROOT = os.path.abspath(
-    os.path.join(
-        os.path.dirname(__file__), 
-        os.pardir
-    )
-)
-sys.path.append(PROJECT_ROOT)
-
-from imagetitler.draw import process_images
+from imagetitler.constants import KEY_INCREMENTAL, KEY_JOBS_FILE, KEY_MANIFEST, KEY_OUTPUT_PATH, KEY_PROFILE, \
+    KEY_PROFILER, KEY_RESULTS_FILE
+from imagetitler.draw import iter_process_images
+from imagetitler.jobs import run_jobs
+from imagetitler.manifest import Manifest
 from imagetitler.parse import parse_input
-from imagetitler.store import save_copies
+from imagetitler.profiling import Profiler
+from imagetitler.store import iter_save_copies
 
 
 def main() -> None:
     """
-    The main function.
+    The main function. Images are rendered and saved one at a time,
+    so memory use does not grow with the size of a batch (or job file).
 
     :return: None
     """
     args = vars(parse_input())
-    images = process_images(**args)
-    save_copies(images, **args)
+    if args.get(KEY_INCREMENTAL):
+        args[KEY_MANIFEST] = Manifest(args.get(KEY_OUTPUT_PATH))
+    if args.get(KEY_PROFILE):
+        args[KEY_PROFILER] = Profiler()
+    if jobs_file := args.get(KEY_JOBS_FILE):
+        succeeded, failed = run_jobs(jobs_file, args.get(KEY_RESULTS_FILE), **args)
+        print(f"Rendered {succeeded} job(s), {failed} failed")
+    else:
+        images = iter_process_images(**args)
+        for _ in iter_save_copies(images, **args):
+            pass
+    if manifest := args.get(KEY_MANIFEST):
+        print(manifest.summary())
+    if profiler := args.get(KEY_PROFILER):
+        profiler.save(args[KEY_PROFILE])
 
 
 if __name__ == '__main__':
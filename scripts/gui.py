@@ -2,36 +2,22 @@
 The GUI interface for the image-titler script.
 """
 
-import os
-import sys
 import tkinter as tk
 import tkinter.ttk as ttk
+from concurrent.futures import ThreadPoolExecutor, Future
 from pathlib import Path
 from tkinter import filedialog
 from typing import Optional, List
 
 from PIL import ImageTk, Image
-from matplotlib import font_manager
-
-PROJECT_ROOT = os.path.abspath(
-    os.path.join(
-        os.path.dirname(__file__), 
-        os.pardir
-    )
-)
-sys.path.append(PROJECT_ROOT)
 
 from imagetitler import __version__
 from imagetitler.constants import *
 from imagetitler.draw import process_images
+from imagetitler.fonts import load_font_index, get_font_label
 from imagetitler.parse import parse_input
 from imagetitler.store import save_copies
 
-FONTS = {
-    f"{f.name} ({f.style}, {f.variant}, {f.weight}, {f.stretch})": f.fname
-    for f in font_manager.fontManager.ttflist
-}
-
 FILE_TAB_LABEL = "File"
 NEW_IMAGE_LABEL = "New Image"
 NEW_LOGO_LABEL = "New Logo"
@@ -41,6 +27,9 @@ TIER_OPTION_LABEL = "Tier:"
 LOGO_OPTION_LABEL = "Logo:"
 
 COLUMN_WIDTH = 8
+PREVIEW_SIZE = 1028  # the longest side of the preview in pixels
+PREVIEW_DELAY = 150  # milliseconds to wait for more changes before rendering a preview
+PREVIEW_POLL_INTERVAL = 25  # milliseconds between checks on a preview render
 
 
 class ImageTitlerMain(tk.Tk):
@@ -66,7 +55,8 @@ class ImageTitlerMain(tk.Tk):
 
     def save_as(self) -> None:
         """
-        A save method which saves our preview. This has to exist because the menu
+        A save method which renders and saves our edit at full resolution (the preview
+        is only rendered at display resolution). This has to exist because the menu
         has no concept of title. As a result, this method needed to be pulled up
         into main window. That way, we at least decouple the child to parent
         relationship (i.e. children have to concept of siblings, etc.).
@@ -74,7 +64,7 @@ class ImageTitlerMain(tk.Tk):
         :return: None
         """
         save_copies(
-            self.menu.current_edit,
+            process_images(**self.options),
             **self.options
         )
 
@@ -89,6 +79,11 @@ class ImageTitlerGUI(ttk.Frame):
         self.menu = menu
         self.options = options
         self.logo_path = None
+        self.preview_executor = ThreadPoolExecutor(max_workers=1)
+        self.preview_job: Optional[str] = None
+        self.preview_request: Optional[tuple] = None
+        self.preview_future: Optional[Future] = None
+        self.preview_generation = 0
         self.option_pane = ImageTitlerOptionPane(self, self.options)
         self.preview = ImageTitlerPreviewPane(self,
                                               text=f"Select a file using '{FILE_TAB_LABEL}' > '{NEW_IMAGE_LABEL}'")
@@ -102,7 +97,7 @@ class ImageTitlerGUI(ttk.Frame):
         :return: None
         """
         if self.options[KEY_PATH]:
-            self._render_preview()
+            self._schedule_preview()
         self._render_logo()
 
     def _set_layout(self) -> None:
@@ -115,19 +110,74 @@ class ImageTitlerGUI(ttk.Frame):
         self.preview.pack(side=tk.RIGHT, expand=tk.YES, fill=tk.BOTH, padx=5, pady=5)
         self.option_pane.pack(side=tk.LEFT, anchor=tk.NW, padx=5, pady=5)
 
-    def _render_preview(self) -> None:
+    def _schedule_preview(self) -> None:
+        """
+        Schedules a preview render once the options stop changing for PREVIEW_DELAY
+        milliseconds, so typing a title doesn't render once per keystroke.
+
+        :return: None
+        """
+        if self.preview_job:
+            self.after_cancel(self.preview_job)
+        self.preview_job = self.after(PREVIEW_DELAY, self._request_preview)
+
+    def _request_preview(self) -> None:
+        """
+        Requests a preview of the current options. If a render is already in flight,
+        the request waits for it to finish, and any older waiting request is dropped.
+
+        :return: None
+        """
+        self.preview_job = None
+        self.preview_generation += 1
+        self.preview_request = (self.preview_generation, dict(self.options))
+        if not self.preview_future:
+            self._start_preview()
+
+    def _start_preview(self) -> None:
         """
-        Renders a preview of the edited image in the child preview pane.
+        Hands the latest preview request to the background worker.
 
         :return: None
         """
-        self.menu.current_edit = process_images(**self.options)
-        maxsize = (1028, 1028)
-        small_image = self.menu.current_edit[0].copy()
-        small_image.thumbnail(maxsize, Image.Resampling.LANCZOS)
-        image = ImageTk.PhotoImage(small_image)
-        self.preview.config(image=image)
-        self.preview.image = image
+        generation, options = self.preview_request
+        self.preview_request = None
+        self.preview_future = self.preview_executor.submit(self._render_preview, generation, options)
+        self.after(PREVIEW_POLL_INTERVAL, self._poll_preview)
+
+    def _poll_preview(self) -> None:
+        """
+        Checks on the in-flight preview render from the Tk loop. Finished renders are
+        only shown if no newer request has been made in the meantime.
+
+        :return: None
+        """
+        if not self.preview_future.done():
+            self.after(PREVIEW_POLL_INTERVAL, self._poll_preview)
+            return
+        future, self.preview_future = self.preview_future, None
+        if self.preview_request:
+            self._start_preview()
+        generation, edits = future.result()
+        if generation == self.preview_generation:
+            self.menu.current_edit = edits
+            image = ImageTk.PhotoImage(edits[0])
+            self.preview.config(image=image)
+            self.preview.image = image
+
+    @staticmethod
+    def _render_preview(generation: int, options: dict) -> tuple:
+        """
+        Renders a preview of the edited image straight at display resolution.
+        This runs on a worker thread, so it must not touch any Tk objects.
+
+        :param generation: the generation of the preview request
+        :param options: a snapshot of the options to render
+        :return: a tuple of the generation and the edited images
+        """
+        size = SIZE_MAP.get(options.get(KEY_SIZE) or DEFAULT_SIZE)
+        options[KEY_SCALE] = min(PREVIEW_SIZE / max(size), 1)
+        return generation, process_images(**options)
 
     def _render_logo(self) -> None:
         """
@@ -244,6 +294,9 @@ class ImageTitlerOptionPane(ttk.Frame):
         self.logo_value: Optional[ttk.Label] = None
         self.font_state: tk.IntVar = tk.IntVar()
         self.font_value: tk.StringVar = tk.StringVar()
+        self.font_menu: Optional[ttk.Combobox] = None
+        self.fonts: Optional[dict] = None
+        self.known_fonts: dict = dict()
         self.size_state: tk.IntVar = tk.IntVar()
         self.size_value: tk.StringVar = tk.StringVar()
         self.rows = list()
@@ -262,10 +315,13 @@ class ImageTitlerOptionPane(ttk.Frame):
         tier = self.options.get(KEY_TIER)
         ImageTitlerOptionPane._populate_option(tier, self.tier_value, self.tier_state, list(TIER_MAP.keys())[0])
         font = self.options.get(KEY_FONT)
-        self.font_value.set(sorted(list(FONTS.keys()))[0])
+        self.known_fonts[get_font_label(DEFAULT_FONT)] = DEFAULT_FONT
+        self.font_value.set(get_font_label(DEFAULT_FONT))
         if font != DEFAULT_FONT:
-            font = next(k for k, v in FONTS.items() if Path(v).name == font)
-            ImageTitlerOptionPane._populate_option(font, self.font_value, self.font_state)
+            if not Path(font).is_file():
+                font = next(v for v in self._get_fonts().values() if Path(v).name == font)
+            self.known_fonts[get_font_label(font)] = font
+            ImageTitlerOptionPane._populate_option(get_font_label(font), self.font_value, self.font_state)
         logo = self.options.get(KEY_LOGO_PATH)
         self.logo_state.set(1 if logo else 0)
         size = self.options.get(KEY_SIZE)
@@ -399,16 +455,34 @@ class ImageTitlerOptionPane(ttk.Frame):
             width=COLUMN_WIDTH
         )
         font_label.variable = self.font_state
-        font_list = sorted(FONTS.keys())
-        font_menu = ttk.Combobox(
+        self.font_menu = ttk.Combobox(
             font_frame,
             textvariable=self.font_value,
-            values=font_list,
+            postcommand=self._populate_fonts,
             state="readonly",
             width=40
         )
-        font_menu.bind("<<ComboboxSelected>>", self._update_font)
-        return font_frame, font_label, font_menu, KEY_FONT
+        self.font_menu.bind("<<ComboboxSelected>>", self._update_font)
+        return font_frame, font_label, self.font_menu, KEY_FONT
+
+    def _get_fonts(self) -> dict:
+        """
+        Retrieves the installed fonts from the font index the first time they're needed.
+
+        :return: a dictionary of font labels to font paths
+        """
+        if self.fonts is None:
+            self.fonts = load_font_index()
+        return self.fonts
+
+    def _populate_fonts(self) -> None:
+        """
+        Fills the font menu just before it opens, so the font index
+        is never loaded unless the menu is actually used.
+
+        :return: None
+        """
+        self.font_menu.configure(values=sorted(self._get_fonts().keys()))
 
     def _update_font(self, *_) -> None:
         """
@@ -418,7 +492,8 @@ class ImageTitlerOptionPane(ttk.Frame):
         :return: None
         """
         if self.font_state.get():
-            self.options[KEY_FONT] = FONTS.get(self.font_value.get())
+            label = self.font_value.get()
+            self.options[KEY_FONT] = self.known_fonts.get(label) or self._get_fonts().get(label)
         else:
             self.options[KEY_FONT] = None
         self.parent.update_view()
@@ -0,0 +1,33 @@
+"""
+The HTTP interface for the image-titler script.
+"""
+
+from imagetitler.cache import RenderCache
+from imagetitler.constants import KEY_CACHE_DIR, KEY_CACHE_SIZE, KEY_HOST, KEY_JOBS, KEY_PORT
+from imagetitler.parse import parse_serve_input
+from imagetitler.serve import RenderServer, warm_up
+
+
+def main() -> None:
+    """
+    The main function. The caches are warmed up before the first
+    request is accepted, and the service runs until interrupted.
+
+    :return: None
+    """
+    args = vars(parse_serve_input())
+    cache = RenderCache(args[KEY_CACHE_DIR], disk_limit=args[KEY_CACHE_SIZE] * 1024 * 1024)
+    server = RenderServer((args[KEY_HOST], args[KEY_PORT]), jobs=args[KEY_JOBS], cache=cache)
+    warm_up()
+    print(f"Serving image-titler on http://{args[KEY_HOST]}:{server.server_port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(cache.summary())
+
+
+if __name__ == '__main__':
+    main()
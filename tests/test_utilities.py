@@ -1,11 +1,22 @@
+import json
 import shutil
+import subprocess
 import sys
+import threading
+import tomllib
+import tempfile
 import os
+import urllib.error
+import urllib.request
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from unittest import TestCase
 from unittest.mock import patch
 
-from PIL import Image
+from PIL import Image, ImageDraw, ImageFont
+
+from benchmarks.run import compare_results
 
 PROJECT_ROOT = os.path.abspath(
     os.path.join(
@@ -16,9 +27,35 @@ PROJECT_ROOT = os.path.abspath(
 sys.path.append(PROJECT_ROOT)
 
 from imagetitler import __version__
-from imagetitler.draw import process_images
+from imagetitler.constants import DEFAULT_FONT, DEFAULT_SIZE, SIZE_MAP, TIER_MAP, TRC_IMAGES, FORMAT_MAP
+from imagetitler.draw import (
+    process_images,
+    iter_process_images,
+    _get_appropriate_font_size,
+    _get_best_top_color,
+    _get_best_top_color_sorted,
+    _get_prepared_logo,
+    _get_title_layout,
+    _measure_title_layout,
+    _open_image,
+    _draw_text,
+    TEXT_MASKS,
+    TextMaskCache,
+    _load_font,
+    resolve_options,
+    TEXT_FILL,
+    WHITE,
+)
+from imagetitler.cache import RenderCache, get_cache_key
+from imagetitler.discover import iter_image_files
+from imagetitler.exif import add_user_comment
+from imagetitler.fonts import load_font_index, get_font_label
+from imagetitler.jobs import get_results_path, iter_jobs, run_jobs
+from imagetitler.manifest import Manifest
 from imagetitler.parse import parse_input
-from imagetitler.store import save_copies
+from imagetitler.profiling import Profiler, record, stage
+from imagetitler.serve import RenderServer, get_content_disposition, parse_options, render
+from imagetitler.store import save_copies, iter_save_copies, encode_image, _generate_version_exif
 from scripts import cli
 
 CUSTOM_FONT = "imagetitler/assets/fonts/arial.ttf"
@@ -450,6 +487,116 @@ class TestParseInput(TestUtilities):
             self.assertEqual(args.title, None)
             self.assertFalse(args.no_title)
 
+    def test_jobs(self) -> None:
+        """
+        Tests that the jobs setting is properly stored.
+
+        :return: None
+        """
+        with patch.object(sys, "argv", ["image-titler", "-b", "-j", "4"]):
+            args = parse_input()
+            self.assertEqual(args.batch, True)
+            self.assertEqual(args.jobs, 4)
+        for jobs in ["0", "-2", "two"]:
+            with patch.object(sys, "argv", ["image-titler", "-b", "-j", jobs]), patch("sys.stderr"):
+                self.assertRaises(SystemExit, parse_input)
+
+    def test_max_pixels(self) -> None:
+        """
+        Tests that the max pixels setting is properly stored.
+
+        :return: None
+        """
+        with patch.object(sys, "argv", ["image-titler", "--max_pixels", "1000000"]):
+            args = parse_input()
+            self.assertEqual(args.max_pixels, 1000000)
+        with patch.object(sys, "argv", ["image-titler", "--max_pixels", "-1"]), patch("sys.stderr"):
+            self.assertRaises(SystemExit, parse_input)
+
+    def test_incremental(self) -> None:
+        """
+        Tests that the incremental setting is properly set to True.
+
+        :return: None
+        """
+        with patch.object(sys, "argv", ["image-titler", "-b", "-i"]):
+            args = parse_input()
+            self.assertEqual(args.batch, True)
+            self.assertEqual(args.incremental, True)
+
+    def test_profile(self) -> None:
+        """
+        Tests that the profile report path is properly stored.
+
+        :return: None
+        """
+        with patch.object(sys, "argv", ["image-titler", "--profile", "report.json"]):
+            args = parse_input()
+            self.assertEqual(args.profile, "report.json")
+
+    def test_pipeline(self) -> None:
+        """
+        Tests that the pipeline setting is properly set to True.
+
+        :return: None
+        """
+        with patch.object(sys, "argv", ["image-titler", "-b", "--pipeline"]):
+            args = parse_input()
+            self.assertEqual(args.pipeline, True)
+
+    def test_discovery(self) -> None:
+        """
+        Tests that the recursive, include, and exclude settings are properly stored.
+
+        :return: None
+        """
+        command = ["image-titler", "-b", "--recursive", "--include", "*.png", "--exclude", "drafts", "--exclude", "old"]
+        with patch.object(sys, "argv", command):
+            args = parse_input()
+            self.assertEqual(args.recursive, True)
+            self.assertEqual(args.include, ["*.png"])
+            self.assertEqual(args.exclude, ["drafts", "old"])
+
+    def test_variants(self) -> None:
+        """
+        Tests that comma-separated sizes and tiers are properly stored as lists,
+        while a single size is still stored as is.
+
+        :return: None
+        """
+        with patch.object(sys, "argv", ["image-titler", "-s", "DEV,Twitter", "-r", "free,premium"]):
+            args = parse_input()
+            self.assertEqual(args.size, ["DEV", "Twitter"])
+            self.assertEqual(args.tier, ["free", "premium"])
+        with patch.object(sys, "argv", ["image-titler", "-s", "DEV"]):
+            self.assertEqual(parse_input().size, "DEV")
+        with patch.object(sys, "argv", ["image-titler", "-s", "DEV,Facebook"]), patch("sys.stderr"):
+            self.assertRaises(SystemExit, parse_input)
+
+    def test_jobs_file(self) -> None:
+        """
+        Tests that the jobs file and results file settings are properly stored.
+
+        :return: None
+        """
+        with patch.object(sys, "argv", ["image-titler", "--jobs-file", "jobs.csv", "--results_file", "results.jsonl"]):
+            args = parse_input()
+            self.assertEqual(args.jobs_file, "jobs.csv")
+            self.assertEqual(args.results_file, "results.jsonl")
+        with patch.object(sys, "argv", ["image-titler", "--jobs_file", "jobs.csv", "-i"]), patch("sys.stderr"):
+            self.assertRaises(SystemExit, parse_input)
+
+    def test_format_and_encoder(self) -> None:
+        """
+        Tests that the format and encoder settings are properly stored.
+
+        :return: None
+        """
+        with patch.object(sys, "argv", ["image-titler", "--format", "webp", "-e", "web"]):
+            args = parse_input()
+            self.assertEqual(args.format, "webp")
+            self.assertEqual(args.encoder, "web")
+
     def test_tier_free(self) -> None:
         """
         Tests that the free tier is properly stored.
@@ -507,6 +654,139 @@ class TestProcessImages(TestUtilities):
         self.images.extend(process_images(path=IMAGE_FOLDER, batch=True))
         self.assertEqual(len(TEST_IMAGES), len(self.images))
 
+    def test_many_images_parallel(self) -> None:
+        """
+        Tests that the batch processing feature produces the same images
+        in the same order regardless of the number of jobs.
+
+        :return: None
+        """
+        serial = process_images(path=IMAGE_FOLDER, batch=True, jobs=1)
+        parallel = process_images(path=IMAGE_FOLDER, batch=True, jobs=2)
+        self.assertEqual([image.filename for image in serial], [image.filename for image in parallel])
+        for expected, actual in zip(serial, parallel):
+            self.assertEqual(expected.tobytes(), actual.tobytes())
+
+    def test_many_images_pipeline(self) -> None:
+        """
+        Tests that the pipelined batch processing feature produces the same images
+        in the same order as processing them one at a time.
+
+        :return: None
+        """
+        serial = process_images(path=IMAGE_FOLDER, batch=True, jobs=1)
+        pipelined = process_images(path=IMAGE_FOLDER, batch=True, jobs=2, pipeline=True)
+        self.assertEqual([image.filename for image in serial], [image.filename for image in pipelined])
+        for expected, actual in zip(serial, pipelined):
+            self.assertEqual(expected.tobytes(), actual.tobytes())
+
+    def test_variants(self) -> None:
+        """
+        Tests that a list of sizes and tiers renders a variant of the image for each
+        combination, with the same pixels as rendering each variant on its own.
+
+        :return: None
+        """
+        options = dict(path=DEFAULT_IMAGE, logo_path=TRC_ICON_PATH)
+        variants = process_images(size=["DEV", "YouTube"], tier=["free", "premium"], **options)
+        self.assertEqual(["dev-free", "dev-premium", "youtube-free", "youtube-premium"], [image.variant for image in variants])
+        self.assertEqual([SIZE_MAP["DEV"]] * 2 + [SIZE_MAP["YouTube"]] * 2, [image.size for image in variants])
+        expected = process_images(size="YouTube", tier="premium", **options)[0]
+        self.assertEqual(expected.tobytes(), variants[-1].tobytes())
+
+    def test_many_images_fixed_title(self) -> None:
+        """
+        Tests that batches with a fixed title, which paste a shared overlay,
+        match images that have their overlay drawn directly.
+
+        :return: None
+        """
+        options = dict(title="Test Fixed Title", tier="premium", logo_path=VF_ICON_PATH)
+        self.images.extend(process_images(path=IMAGE_FOLDER, batch=True, jobs=1, **options))
+        for edited_image in self.images[:3]:
+            expected = process_images(path=edited_image.filename, **options)[0]
+            self.assertEqual(expected.tobytes(), edited_image.tobytes())
+
+    def test_many_images_overflowing_title(self) -> None:
+        """
+        Tests that a shared overlay matches drawing directly when glyphs (e.g.
+        a cedilla in a tall font) spill past their title bars.
+
+        :return: None
+        """
+        options = dict(title="Ýŏ ÅÉ ÇÖ", font=CUSTOM_FONT, size="YouTube")
+        self.images.extend(process_images(path=IMAGE_FOLDER, batch=True, jobs=1, **options))
+        for edited_image in self.images[:3]:
+            expected = process_images(path=edited_image.filename, **options)[0]
+            self.assertEqual(expected.tobytes(), edited_image.tobytes())
+
+    def test_iter_many_images(self) -> None:
+        """
+        Tests that the streaming batch processing feature yields images lazily.
+
+        :return: None
+        """
+        images = iter_process_images(path=IMAGE_FOLDER, batch=True, jobs=1)
+        self.assertIsInstance(next(images), Image.Image)
+        self.images.extend(images)
+        self.assertEqual(len(TEST_IMAGES) - 1, len(self.images))
+
+    def test_large_image(self) -> None:
+        """
+        Tests that large JPEGs are decoded at a reduced resolution and still
+        produce an image of the requested size.
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "large-image.jpg")
+            Image.new("RGB", (6000, 4000)).save(path)
+            self.assertEqual((3000, 2000), _open_image(resolve_options(), path).size)
+            self.assertEqual((750, 500), _open_image(resolve_options(max_pixels=1_000_000), path).size)
+            self.images.extend(process_images(path=path))
+            self.assertEqual(SIZE_MAP[DEFAULT_SIZE], self.images[0].size)
+
+    def test_max_pixels(self) -> None:
+        """
+        Tests that images which cannot be decoded within the pixel budget are rejected.
+
+        :return: None
+        """
+        with self.assertRaises(ValueError):
+            process_images(path=DEFAULT_IMAGE, max_pixels=100)
+
+    def test_max_pixels_batch(self) -> None:
+        """
+        Tests that a batch skips images over the pixel budget with a warning, and renders the rest.
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            Image.new("RGB", (4000, 3500)).save(os.path.join(directory, "large-image.png"))
+            shutil.copy(DEFAULT_IMAGE, directory)
+            for jobs in [1, 2]:
+                with warnings.catch_warnings(record=True) as caught:
+                    warnings.simplefilter("always", UserWarning)
+                    images = process_images(path=directory, batch=True, jobs=jobs, max_pixels=4_000_000)
+                self.assertEqual([Path(DEFAULT_IMAGE).name], [Path(image.filename).name for image in images])
+                self.assertIn("large-image.png would decode to 4000x3500 pixels", str(caught[0].message))
+                self.assertIn("Skipped 1 image(s)", str(caught[-1].message))
+
+    def test_scale(self) -> None:
+        """
+        Tests that scaled renders shrink the image and keep the layout in proportion.
+
+        :return: None
+        """
+        self.images.extend(process_images(title="Test Scale", size="YouTube", scale=0.5))
+        self.assertEqual((640, 360), self.images[0].size)
+        full = _get_title_layout("Test Scale", resolve_options(size="YouTube"))
+        half = _get_title_layout("Test Scale", resolve_options(size="YouTube", scale=0.5))
+        for full_rectangle, half_rectangle in zip(full.rectangles, half.rectangles):
+            for full_corner, half_corner in zip(full_rectangle, half_rectangle):
+                self.assertAlmostEqual(full_corner[0] / 2, half_corner[0], delta=4)
+                self.assertAlmostEqual(full_corner[1] / 2, half_corner[1], delta=4)
+
     def test_one_line_title(self) -> None:
         """
         Tests that the split text algorithm properly handles single term titles.
@@ -652,6 +932,37 @@ class TestSaveCopies(TestUtilities):
         self.assertEqual(len(TEST_IMAGES), len(self.paths))
         self.verify_existence()
 
+    def test_iter_many_title(self) -> None:
+        """
+        Tests the scenario when multiple images are streamed to the streaming
+        version of save_copies. It should save each image and yield each path
+        as it goes.
+
+        :return: None
+        """
+        paths = iter_save_copies(iter(TEST_IMAGES), title="Test Iter Many With Title Option", batch=True, jobs=1)
+        self.paths.append(next(paths))
+        self.verify_existence()
+        self.paths.extend(paths)
+        self.assertEqual(len(TEST_IMAGES), len(self.paths))
+        self.verify_existence()
+
+    def test_many_title_pipeline(self) -> None:
+        """
+        Tests the scenario when multiple images are encoded and written by separate
+        thread pools. It should save the same files as saving them one at a time.
+
+        :return: None
+        """
+        options = dict(title="Test Many Pipeline", batch=True)
+        serial = save_copies(TEST_IMAGES, jobs=1, **options)
+        expected = [Path(path).read_bytes() for path in serial]
+        for path in serial:
+            Path(path).unlink()
+        self.paths.extend(save_copies(TEST_IMAGES, jobs=2, pipeline=True, **options))
+        self.assertEqual(serial, self.paths)
+        self.assertEqual(expected, [Path(path).read_bytes() for path in self.paths])
+
     def test_special_characters_in_title(self) -> None:
         """
         Tests the scenario when a title is provided with a special character in it.
@@ -662,3 +973,1104 @@ class TestSaveCopies(TestUtilities):
         self.paths.extend(save_copies(TEST_IMAGES, title="Test Special Chars?"))
         self.assertEqual(1, len(self.paths))
         self.verify_existence()
+
+    def test_variants(self) -> None:
+        """
+        Tests the scenario when a list of sizes and tiers is provided. It should save
+        every variant, each with its tag in the file name.
+
+        :return: None
+        """
+        options = dict(title="Test Variants", size=["DEV", "Twitter"], tier=["free", "premium"])
+        self.paths.extend(save_copies(process_images(path=DEFAULT_IMAGE, **options), **options))
+        self.assertEqual(4, len(self.paths))
+        for path, tag in zip(self.paths, ["dev-free", "dev-premium", "twitter-free", "twitter-premium"]):
+            self.assertIn(f"test-variants-{tag}-", Path(path).name)
+        self.verify_existence()
+
+    def test_formats(self) -> None:
+        """
+        Tests the scenario when an output format and encoder profile are provided.
+        It should save the image with the extension and format of that output format.
+
+        :return: None
+        """
+        for output_format, expected in [("jpeg", "JPEG"), ("png", "PNG"), ("webp", "WEBP")]:
+            paths = save_copies(TEST_IMAGES, title=f"Test Format {output_format}", format=output_format, encoder="fast")
+            self.paths.extend(paths)
+            self.assertEqual(FORMAT_MAP[output_format], Path(paths[0]).suffix)
+            with Image.open(paths[0]) as image:
+                self.assertEqual(expected, image.format)
+
+    def test_transparent_jpeg(self) -> None:
+        """
+        Tests the scenario when an image with an alpha channel is saved as a JPEG.
+        It should be converted to RGB rather than fail.
+
+        :return: None
+        """
+        image = Image.open(TRC_ICON_PATH).convert("RGBA")
+        self.paths.extend(save_copies([image], title="Test Transparent JPEG", format="jpeg"))
+        self.verify_existence()
+
+    def test_encoder_sizes(self) -> None:
+        """
+        Tests that the web profile produces smaller JPEGs than the default archive profile.
+
+        :return: None
+        """
+        archive = save_copies(TEST_IMAGES, title="Test Archive Encoder")
+        web = save_copies(TEST_IMAGES, title="Test Web Encoder", encoder="web")
+        self.paths.extend(archive + web)
+        self.assertLess(os.path.getsize(web[0]), os.path.getsize(archive[0]))
+
+
+class TestIterImageFiles(TestUtilities):
+    """
+    A test class for the discovery of batch images in discover.py.
+    """
+
+    def setUp(self) -> None:
+        """
+        Sets up a small tree of images along with some files that aren't images.
+
+        :return: None
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        for path in ["b.jpg", "a.PNG", "posts/c.jpeg", "posts/2020/d.jpg", "drafts/e.jpg"]:
+            Path(self.root, path).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy(DEFAULT_IMAGE, os.path.join(self.root, path))
+        for path in [".DS_Store", "notes.txt", "posts/readme.md"]:
+            Path(self.root, path).touch()
+
+    def tearDown(self) -> None:
+        """
+        Deletes the tree of images.
+
+        :return: None
+        """
+        self.directory.cleanup()
+
+    def _list(self, **kwargs) -> list:
+        """
+        Lists the images in the tree relative to its root.
+
+        :param kwargs: the discovery options
+        :return: a list of relative paths
+        """
+        return [Path(os.path.relpath(path, self.root)).as_posix() for path in iter_image_files(self.root, **kwargs)]
+
+    def test_flat(self) -> None:
+        """
+        Tests that only the images at the top of the tree are listed, in sorted order.
+
+        :return: None
+        """
+        self.assertEqual(["a.PNG", "b.jpg"], self._list())
+
+    def test_recursive(self) -> None:
+        """
+        Tests that subdirectories are searched depth first, in sorted order.
+
+        :return: None
+        """
+        self.assertEqual(
+            ["a.PNG", "b.jpg", "drafts/e.jpg", "posts/c.jpeg", "posts/2020/d.jpg"],
+            self._list(recursive=True)
+        )
+
+    def test_include_exclude(self) -> None:
+        """
+        Tests that images are filtered by glob patterns and excluded directories are skipped.
+
+        :return: None
+        """
+        self.assertEqual(["posts/2020/d.jpg"], self._list(recursive=True, include=["*/d.jpg"]))
+        self.assertEqual(["b.jpg", "posts/2020/d.jpg"], self._list(recursive=True, include=["*.jpg"], exclude=["drafts"]))
+
+    def test_lazy(self) -> None:
+        """
+        Tests that the first image is found before any subdirectory is scanned.
+
+        :return: None
+        """
+        with patch("os.scandir", wraps=os.scandir) as scandir:
+            self.assertEqual("a.PNG", Path(next(iter_image_files(self.root, recursive=True))).name)
+            self.assertEqual(1, scandir.call_count)
+
+    def test_mirrored_output(self) -> None:
+        """
+        Tests that a recursive batch stores each image in the matching subdirectory of the output path.
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as output_path:
+            options = dict(path=self.root, batch=True, recursive=True, exclude=["drafts"], output_path=output_path)
+            paths = list(iter_save_copies(iter_process_images(**options), **options))
+            version = __version__.replace(".", "-")
+            self.assertEqual(
+                [f"a-v{version}.PNG", f"b-v{version}.jpg", f"posts/c-v{version}.jpeg", f"posts/2020/d-v{version}.jpg"],
+                [Path(os.path.relpath(path, output_path)).as_posix() for path in paths]
+            )
+            for path in paths:
+                self.assertTrue(os.path.isfile(path))
+
+
+class TestGenerateVersionExif(TestUtilities):
+    """
+    A test class for the version tag in the EXIF data of saved images.
+    """
+
+    VERSION_COMMENT = f"ASCII\x00\x00\x00image-titler-v{__version__.replace('.', '-')}".encode()
+
+    @staticmethod
+    def _load_exif(exif: bytes) -> Image.Exif:
+        """
+        Parses a block of EXIF data.
+
+        :param exif: the EXIF data
+        :return: the parsed EXIF data
+        """
+        parsed = Image.Exif()
+        parsed.load(exif)
+        return parsed
+
+    def test_without_exif(self) -> None:
+        """
+        Tests that images without EXIF data are still tagged with the version.
+
+        :return: None
+        """
+        exif = self._load_exif(_generate_version_exif(Image.new("RGB", (10, 10))))
+        self.assertEqual(self.VERSION_COMMENT, exif.get_ifd(0x8769)[0x9286])
+
+    def test_with_exif(self) -> None:
+        """
+        Tests that the version is added to existing EXIF data, in either byte order,
+        without disturbing the other fields.
+
+        :return: None
+        """
+        for endian in "<>":
+            original = Image.Exif()
+            original.endian = endian  # the byte order used by tobytes
+            original[0x0112] = 6  # orientation
+            original[0x010F] = "Camera Maker"
+            original.get_ifd(0x8769)[0x9003] = "2020:01:01 00:00:00"  # date taken
+            image = Image.new("RGB", (10, 10))
+            image.info["exif"] = original.tobytes()
+            exif = self._load_exif(_generate_version_exif(image))
+            self.assertEqual(6, exif[0x0112])
+            self.assertEqual("Camera Maker", exif[0x010F])
+            self.assertEqual("2020:01:01 00:00:00", exif.get_ifd(0x8769)[0x9003])
+            self.assertEqual(self.VERSION_COMMENT, exif.get_ifd(0x8769)[0x9286])
+
+    def test_with_user_comment(self) -> None:
+        """
+        Tests that an existing comment with enough room is overwritten in place.
+
+        :return: None
+        """
+        original = Image.Exif()
+        original.get_ifd(0x8769)[0x9286] = b"ASCII\x00\x00\x00" + b" " * 64
+        exif = original.tobytes()
+        updated = add_user_comment(exif, "test")
+        self.assertEqual(len(exif), len(updated))
+        self.assertEqual(b"ASCII\x00\x00\x00test", self._load_exif(updated).get_ifd(0x8769)[0x9286])
+
+    def test_malformed_exif(self) -> None:
+        """
+        Tests that EXIF data that can't be parsed is carried over as is.
+
+        :return: None
+        """
+        self.assertEqual(b"Exif\x00\x00garbage", add_user_comment(b"Exif\x00\x00garbage", "test"))
+
+    def test_icc_profile(self) -> None:
+        """
+        Tests that the ICC profile and orientation of an input image survive editing and saving.
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "icc-profile.jpg")
+            icc_profile = b"\x00" * 128  # contents are not validated
+            exif = Image.Exif()
+            exif[0x0112] = 6
+            Image.new("RGB", (1600, 1000)).save(path, icc_profile=icc_profile, exif=exif)
+            storage_path = save_copies(process_images(path=path), output_path=directory)[0]
+            with Image.open(storage_path) as image:
+                self.assertEqual(icc_profile, image.info.get("icc_profile"))
+                self.assertEqual(6, image.getexif()[0x0112])
+                self.assertEqual(self.VERSION_COMMENT, image.getexif().get_ifd(0x8769)[0x9286])
+
+
+class TestGetAppropriateFontSize(TestUtilities):
+    """
+    A test class for the font fitting algorithm in draw.py.
+    """
+
+    def test_matches_linear_search(self) -> None:
+        """
+        Tests that the font size search picks the same size as stepping
+        through every font size one at a time.
+
+        :return: None
+        """
+        for font in [DEFAULT_FONT, CUSTOM_FONT, CUSTOM_FONT_TALL]:
+            for size, (_, height) in SIZE_MAP.items():
+                for title in ["Test Font Size", "OneLineTitle", "gy"]:
+                    expected = 12
+                    while ImageFont.truetype(font, expected).getbbox(title)[3] < height // 7 - 10:
+                        expected += 1
+                    actual = _get_appropriate_font_size(title, resolve_options(font=font, size=size))
+                    self.assertEqual(expected, actual.size)
+
+
+class TestResolveOptions(TestUtilities):
+    """
+    A test class for the render options in draw.py.
+    """
+
+    def test_defaults(self) -> None:
+        """
+        Tests that missing options are resolved to their defaults.
+
+        :return: None
+        """
+        options = resolve_options()
+        self.assertEqual((DEFAULT_SIZE, DEFAULT_FONT), (options.size, options.font))
+        self.assertEqual(SIZE_MAP[DEFAULT_SIZE], (options.width, options.height))
+        self.assertEqual(SIZE_MAP[DEFAULT_SIZE][1] // 7, options.bar_height)
+        self.assertIsNone(options.tier_color)
+        self.assertEqual(options, resolve_options(size=DEFAULT_SIZE, font=None, scale=None))
+
+    def test_resolved(self) -> None:
+        """
+        Tests that provided options are resolved, including the scale and tier color.
+
+        :return: None
+        """
+        options = resolve_options(size="YouTube", scale=0.5, tier="premium", font=CUSTOM_FONT)
+        self.assertEqual((640, 360, 360 // 7), (options.width, options.height, options.bar_height))
+        self.assertEqual(TIER_MAP["premium"], options.tier_color)
+        self.assertEqual(CUSTOM_FONT, options.font)
+
+    def test_frozen(self) -> None:
+        """
+        Tests that options can't be changed and can key a cache.
+
+        :return: None
+        """
+        options = resolve_options()
+        with self.assertRaises(AttributeError):
+            options.size = "YouTube"
+        self.assertFalse(hasattr(options, "__dict__"))
+        self.assertEqual({options: 1}[resolve_options()], 1)
+
+
+class TestGetTitleLayout(TestUtilities):
+    """
+    A test class for the title layout plans in draw.py.
+    """
+
+    def test_two_line_title(self) -> None:
+        """
+        Tests that a multi-word title is planned as two bars stacked from the top.
+
+        :return: None
+        """
+        layout = _get_title_layout("Test Title Layout", resolve_options())
+        self.assertEqual(("Test Title", "Layout"), layout.lines)
+        self.assertEqual(2, len(layout.rectangles))
+        self.assertEqual(2, len(layout.text_positions))
+        self.assertLess(layout.rectangles[0][1][1], layout.rectangles[1][0][1])
+        self.assertIsNone(layout.outline)
+
+    def test_one_line_title(self) -> None:
+        """
+        Tests that a single word title is planned as a single bar.
+
+        :return: None
+        """
+        layout = _get_title_layout("OneLineTitle", resolve_options(size="YouTube"))
+        self.assertEqual(("OneLineTitle",), layout.lines)
+        self.assertEqual(SIZE_MAP["YouTube"][0], layout.rectangles[0][1][0])
+
+    def test_tier_reuses_measurement(self) -> None:
+        """
+        Tests that changing the tier only changes the outline of the plan.
+
+        :return: None
+        """
+        free = _get_title_layout("Test Tier Reuse", resolve_options(tier="free"))
+        hits = _measure_title_layout.cache_info().hits
+        premium = _get_title_layout("Test Tier Reuse", resolve_options(tier="premium"))
+        self.assertEqual(hits + 1, _measure_title_layout.cache_info().hits)
+        self.assertEqual(free._replace(outline=None), premium._replace(outline=None))
+        self.assertNotEqual(free.outline, premium.outline)
+
+
+class TestGetTextMask(TestUtilities):
+    """
+    A test class for the text mask cache in draw.py.
+    """
+
+    def test_matches_draw_text(self) -> None:
+        """
+        Tests that pasting a cached mask draws exactly what ImageDraw.text would.
+
+        :return: None
+        """
+        font = _load_font(DEFAULT_FONT, 57)
+        for mode in ["RGB", "RGBA", "P"]:
+            expected = Image.effect_noise((600, 150), 60).convert(mode)
+            actual = expected.copy()
+            ImageDraw.Draw(expected).text((11.5, 20.5), "Test Text Mask", fill=TEXT_FILL, font=font)
+            _draw_text(ImageDraw.Draw(actual), (11.5, 20.5), "Test Text Mask", DEFAULT_FONT, 57)
+            self.assertEqual(expected.tobytes(), actual.tobytes(), mode)
+
+    def test_recurring_lines(self) -> None:
+        """
+        Tests that lines which were drawn before are pasted from the cache.
+
+        :return: None
+        """
+        process_images(title="Test Glyph Reuse", tier="free")
+        hits, misses = TEXT_MASKS.hits, TEXT_MASKS.misses
+        process_images(title="Test Glyph Reuse", tier="premium")
+        self.assertEqual((hits + 2, misses), (TEXT_MASKS.hits, TEXT_MASKS.misses))
+
+    def test_byte_limit(self) -> None:
+        """
+        Tests that the cache stays within its byte limit, evicting the least recently used masks.
+
+        :return: None
+        """
+        cache = TextMaskCache(limit=250)
+        for key in "abc":
+            cache.put((key,), (Image.new("L", (10, 10)), (0, 0)))
+        self.assertEqual(200, cache.bytes)
+        self.assertEqual([("b",), ("c",)], list(cache.masks))
+        cache.get(("b",))
+        cache.put(("d",), (Image.new("L", (10, 10)), (0, 0)))
+        self.assertEqual([("b",), ("d",)], list(cache.masks))
+        cache.put(("e",), (Image.new("L", (20, 20)), (0, 0)))
+        self.assertIsNone(cache.get(("e",)))
+
+
+class TestGetPreparedLogo(TestUtilities):
+    """
+    A test class for the prepared logo cache in draw.py.
+    """
+
+    def test_colors(self) -> None:
+        """
+        Tests that the dominant color is computed for each sample logo.
+
+        :return: None
+        """
+        self.assertEqual(TRC_RED, _get_prepared_logo(resolve_options(logo_path=TRC_ICON_PATH)).color)
+        self.assertEqual(VF_BLUE, _get_prepared_logo(resolve_options(logo_path=VF_ICON_PATH)).color)
+
+    def test_logo_size(self) -> None:
+        """
+        Tests that the logo is resized to fit beside the bars of the selected size.
+
+        :return: None
+        """
+        logo = _get_prepared_logo(resolve_options(logo_path=TRC_ICON_PATH, size="YouTube"))
+        self.assertEqual((SIZE_MAP["YouTube"][1] // 7,) * 2, logo.image.size)
+        self.assertEqual(logo.image.size, logo.mask.size)
+
+    def test_cache(self) -> None:
+        """
+        Tests that a logo is only prepared again when its file changes.
+
+        :return: None
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "logo.png")
+            shutil.copy(TRC_ICON_PATH, path)
+            logo = _get_prepared_logo(resolve_options(logo_path=path))
+            self.assertIs(logo, _get_prepared_logo(resolve_options(logo_path=path)))
+            shutil.copy(VF_ICON_PATH, path)
+            os.utime(path, ns=(0, 0))
+            self.assertEqual(VF_BLUE, _get_prepared_logo(resolve_options(logo_path=path)).color)
+
+
+class TestGetBestTopColor(TestUtilities):
+    """
+    A test class for the dominant color detection in draw.py.
+    """
+
+    def test_sample_logos(self) -> None:
+        """
+        Tests that both color detection algorithms agree on the sample logos.
+
+        :return: None
+        """
+        for path, expected in [(TRC_ICON_PATH, TRC_RED), (VF_ICON_PATH, VF_BLUE)]:
+            logo = Image.open(path).convert("RGBA")
+            self.assertEqual(expected, _get_best_top_color(logo))
+            self.assertEqual(expected, _get_best_top_color_sorted(logo))
+
+    def test_sampled(self) -> None:
+        """
+        Tests that sampling a large logo still finds the dominant color.
+
+        :return: None
+        """
+        logo = Image.open(VF_ICON_PATH).convert("RGBA")
+        self.assertEqual(VF_BLUE, _get_best_top_color(logo, max_samples=10_000))
+
+    def test_large_logo(self) -> None:
+        """
+        Tests that large logos aren't sampled unless asked to, so both algorithms agree on them.
+
+        :return: None
+        """
+        logo = Image.new("RGBA", (1500, 1000), TRC_RED)
+        logo.paste(VF_BLUE, (0, 0, 1500, 500))
+        logo.paste(VF_BLUE, (0, 999, 1, 1000))  # tips the count, but falls between samples
+        self.assertEqual(VF_BLUE, _get_best_top_color(logo))
+        self.assertEqual(VF_BLUE, _get_best_top_color_sorted(logo))
+
+    def test_all_white(self) -> None:
+        """
+        Tests that both algorithms reject an image with no color other than white.
+
+        :return: None
+        """
+        logo = Image.new("RGBA", (10, 10), WHITE)
+        self.assertRaises(ValueError, _get_best_top_color, logo)
+        self.assertRaises(ValueError, _get_best_top_color_sorted, logo)
+
+
+class TestManifest(TestUtilities):
+    """
+    A test class for incremental batches, which are tracked by the Manifest in manifest.py.
+    """
+
+    def setUp(self) -> None:
+        """
+        Sets up a small input folder and an empty output folder.
+
+        :return: None
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_path = os.path.join(self.directory.name, "input")
+        self.output_path = os.path.join(self.directory.name, "output")
+        Path(self.input_path).mkdir()
+        Path(self.output_path).mkdir()
+        for path in [DEFAULT_IMAGE, FREE_IMAGE, ONE_LINE_TITLE_IMAGE]:
+            shutil.copy(path, self.input_path)
+
+    def tearDown(self) -> None:
+        """
+        Deletes the input and output folders.
+
+        :return: None
+        """
+        self.directory.cleanup()
+
+    def _run(self, **kwargs) -> Manifest:
+        """
+        Runs an incremental batch over the input folder.
+
+        :param kwargs: any additional options
+        :return: the manifest used by the run
+        """
+        manifest = Manifest(self.output_path)
+        options = dict(batch=True, jobs=1, path=self.input_path, output_path=self.output_path, manifest=manifest)
+        options.update(kwargs)
+        list(iter_save_copies(iter_process_images(**options), **options))
+        return manifest
+
+    def test_skips_unchanged(self) -> None:
+        """
+        Tests that a second run over unchanged inputs skips every image.
+
+        :return: None
+        """
+        self.assertEqual((3, 3), (self._run().rendered, self._run().skipped))
+        self.assertEqual(0, self._run().rendered)
+
+    def test_renders_changed(self) -> None:
+        """
+        Tests that changed inputs and changed options are rendered again, without
+        disturbing the output indices of the images that were skipped.
+
+        :return: None
+        """
+        self._run(title="Test Manifest")
+        os.utime(os.path.join(self.input_path, Path(FREE_IMAGE).name), ns=(0, 0))
+        manifest = self._run(title="Test Manifest")
+        self.assertEqual((1, 2), (manifest.rendered, manifest.skipped))
+        self.assertEqual(3, len([path for path in os.listdir(self.output_path) if path.endswith(".jpg")]))
+        self.assertEqual(3, self._run(title="Test Manifest", tier="free").rendered)
+
+    def test_variants(self) -> None:
+        """
+        Tests that every variant of an input is tracked, so a missing variant
+        renders its input again, and that inputs are only counted once.
+
+        :return: None
+        """
+        options = dict(size=["DEV", "YouTube"], tier=["free", "premium"])
+        self.assertEqual(3, self._run(**options).rendered)
+        self.assertEqual(12, len([path for path in os.listdir(self.output_path) if path.endswith(".jpg")]))
+        missing = next(path for path in os.listdir(self.output_path) if "-dev-free-" in path)
+        os.remove(os.path.join(self.output_path, missing))
+        manifest = self._run(**options)
+        self.assertEqual((1, 2), (manifest.rendered, manifest.skipped))
+        self.assertIn(missing, os.listdir(self.output_path))
+        self.assertEqual([4] * 3, [len(entry["outputs"]) for entry in manifest.entries.values()])
+
+
+class TestProfiler(TestUtilities):
+    """
+    A test class for the stage timing hooks in profiling.py.
+    """
+
+    def test_stage_without_record(self) -> None:
+        """
+        Tests that stages outside of a record are not timed.
+
+        :return: None
+        """
+        with record(enabled=False) as timings:
+            with stage("decode"):
+                pass
+        self.assertIsNone(timings)
+
+    def test_stage_with_record(self) -> None:
+        """
+        Tests that repeated stages within a record are summed.
+
+        :return: None
+        """
+        with record() as timings:
+            with stage("decode"):
+                pass
+            with stage("decode"):
+                pass
+        self.assertEqual(["decode"], list(timings))
+        self.assertGreater(timings["decode"], 0)
+
+    def test_report(self) -> None:
+        """
+        Tests that the report merges timings per image and aggregates each stage.
+
+        :return: None
+        """
+        profiler = Profiler()
+        for index in range(10):
+            profiler.add(f"image-{index}.jpg", {"decode": index + 1})
+        profiler.add("image-0.jpg", {"encode": 2})
+        report = profiler.report()
+        self.assertEqual({"decode": 1, "encode": 2, "total": 3}, report["images"]["image-0.jpg"])
+        self.assertEqual(10, report["stages"]["decode"]["count"])
+        self.assertEqual(5, report["stages"]["decode"]["p50"])
+        self.assertEqual(9, report["stages"]["decode"]["p90"])
+        self.assertEqual(10, report["stages"]["decode"]["p99"])
+        self.assertEqual(1, report["stages"]["encode"]["count"])
+
+    def test_batch(self) -> None:
+        """
+        Tests that rendering and saving a batch in parallel times every stage of every image.
+
+        :return: None
+        """
+        profiler = Profiler()
+        with tempfile.TemporaryDirectory() as output_path:
+            options = dict(batch=True, jobs=2, logo_path=TRC_ICON_PATH, output_path=output_path, profiler=profiler)
+            list(iter_save_copies(iter_process_images(**options), **options))
+        report = profiler.report()
+        self.assertEqual(len(os.listdir(TRC_IMAGES)), len(report["images"]))
+        for timings in report["images"].values():
+            self.assertEqual(
+                {"decode", "resize", "logo", "font", "overlay", "exif", "encode", "total"},
+                set(timings)
+            )
+
+    def test_pipeline(self) -> None:
+        """
+        Tests that a pipelined batch also times reading and writing each image.
+
+        :return: None
+        """
+        profiler = Profiler()
+        with tempfile.TemporaryDirectory() as output_path:
+            options = dict(batch=True, jobs=2, pipeline=True, output_path=output_path, profiler=profiler)
+            list(iter_save_copies(iter_process_images(**options), **options))
+        report = profiler.report()
+        self.assertEqual(len(os.listdir(TRC_IMAGES)), len(report["images"]))
+        for timings in report["images"].values():
+            self.assertEqual(
+                {"read", "decode", "resize", "font", "overlay", "exif", "encode", "write", "total"},
+                set(timings)
+            )
+
+
+class TestLoadFontIndex(TestUtilities):
+    """
+    A test class for the cached font index in fonts.py.
+    """
+
+    def setUp(self) -> None:
+        """
+        Sets up a font directory with a single font and a place for the index.
+
+        :return: None
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.font_path = os.path.join(self.directory.name, "fonts")
+        self.index_path = os.path.join(self.directory.name, "cache", "fonts.json")
+        Path(self.font_path).mkdir()
+        shutil.copy(CUSTOM_FONT, self.font_path)
+
+    def tearDown(self) -> None:
+        """
+        Deletes the font directory and index.
+
+        :return: None
+        """
+        self.directory.cleanup()
+
+    def test_index(self) -> None:
+        """
+        Tests that fonts are labeled by family and style, and that the index is cached.
+
+        :return: None
+        """
+        fonts = load_font_index([self.font_path], self.index_path)
+        self.assertEqual({get_font_label(CUSTOM_FONT): os.path.join(self.font_path, "arial.ttf")}, fonts)
+        self.assertTrue(Path(self.index_path).exists())
+        with patch("imagetitler.fonts._scan_font_directories") as scan:
+            self.assertEqual(fonts, load_font_index([self.font_path], self.index_path))
+            scan.assert_not_called()
+
+    def test_rescan(self) -> None:
+        """
+        Tests that the index is rebuilt when a font directory changes.
+
+        :return: None
+        """
+        load_font_index([self.font_path], self.index_path)
+        shutil.copy(CUSTOM_FONT_TALL, self.font_path)
+        os.utime(self.font_path, ns=(0, 0))
+        self.assertEqual(2, len(load_font_index([self.font_path], self.index_path)))
+
+
+class TestCompareResults(TestUtilities):
+    """
+    A test class for the compare_results function of the benchmarks.
+    """
+
+    BASELINE = {"benchmarks": {"resize": {"median": 0.1}, "overlay": {"median": 0.002}}}
+
+    def test_within_tolerance(self) -> None:
+        """
+        Tests that small slowdowns and speedups are not flagged.
+
+        :return: None
+        """
+        results = {"benchmarks": {"resize": {"median": 0.12}, "overlay": {"median": 0.001}}}
+        self.assertEqual(compare_results(results, self.BASELINE, tolerance=0.25), dict())
+
+    def test_slowdown(self) -> None:
+        """
+        Tests that slowdowns beyond the tolerance are flagged with their ratio.
+
+        :return: None
+        """
+        results = {"benchmarks": {"resize": {"median": 0.1}, "overlay": {"median": 0.004}}}
+        self.assertEqual(compare_results(results, self.BASELINE, tolerance=0.25), {"overlay": 2.0})
+
+    def test_missing_baseline(self) -> None:
+        """
+        Tests that benchmarks without a baseline are ignored.
+
+        :return: None
+        """
+        results = {"benchmarks": {"font_size": {"median": 1.0}}}
+        self.assertEqual(compare_results(results, self.BASELINE), dict())
+
+
+class TestRunJobs(TestUtilities):
+    """
+    A test class for the jobs.py file.
+    """
+
+    def setUp(self) -> None:
+        """
+        Prepares an empty directory for the job files and outputs of each test.
+
+        :return: None
+        """
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        """
+        Deletes the directory.
+
+        :return: None
+        """
+        shutil.rmtree(self.directory)
+
+    def read_results(self, jobs_path: str) -> list:
+        """
+        Reads the results file of a job file.
+
+        :param jobs_path: the path to the job file
+        :return: the result of each row
+        """
+        with open(get_results_path(jobs_path)) as results_file:
+            return [json.loads(line) for line in results_file]
+
+    def test_jsonl(self) -> None:
+        """
+        Tests that every row of a JSONL file is rendered with its own options,
+        and that bad rows are reported without stopping the rest.
+
+        :return: None
+        """
+        output = os.path.join(self.directory, "output")
+        rows = [
+            json.dumps({"path": DEFAULT_IMAGE, "title": "Test Jobs One", "size": "YouTube", "output": output}),
+            json.dumps({"path": DEFAULT_IMAGE, "title": "Test Jobs Two", "tier": "gold"}),
+            "not json",
+            json.dumps({"path": LOGO_BLUE_IMAGE, "logo": VF_ICON_PATH, "tier": "free,premium", "output": output}),
+        ]
+        jobs_path = os.path.join(self.directory, "jobs.jsonl")
+        Path(jobs_path).write_text("\n".join(rows) + "\n")
+        self.assertEqual((2, 2), run_jobs(jobs_path, encoder="fast"))
+        results = self.read_results(jobs_path)
+        self.assertEqual([1, 2, 3, 4], [result["row"] for result in results])
+        self.assertEqual(["ok", "error", "error", "ok"], [result["status"] for result in results])
+        self.assertIn("gold", results[1]["error"])
+        self.assertEqual([DEFAULT_IMAGE, DEFAULT_IMAGE, None], [result["path"] for result in results[:3]])
+        with Image.open(results[0]["outputs"][0]) as image:
+            self.assertEqual(SIZE_MAP["YouTube"], image.size)
+        self.assertEqual(2, len(results[3]["outputs"]))
+        for path in results[0]["outputs"] + results[3]["outputs"]:
+            self.assertTrue(Path(path).exists(), path)
+
+    def test_csv(self) -> None:
+        """
+        Tests that a CSV file is read by its header, with empty cells left to the defaults.
+
+        :return: None
+        """
+        jobs_path = os.path.join(self.directory, "jobs.csv")
+        Path(jobs_path).write_text(
+            "path,title,tier,size,logo,font,output\n"
+            f"{DEFAULT_IMAGE},Test Jobs CSV,premium,,,,{self.directory}\n"
+            f"{DEFAULT_IMAGE},,,DEV,,{CUSTOM_FONT},{self.directory}\n"
+        )
+        self.assertEqual((2, 0), run_jobs(jobs_path))
+        results = self.read_results(jobs_path)
+        self.assertIn("test-jobs-csv", results[0]["outputs"][0])
+        with Image.open(results[1]["outputs"][0]) as image:
+            self.assertEqual(SIZE_MAP["DEV"], image.size)
+
+    def test_streamed(self) -> None:
+        """
+        Tests that rows are read lazily, one at a time, and numbered by line.
+
+        :return: None
+        """
+        jobs_path = os.path.join(self.directory, "jobs.jsonl")
+        Path(jobs_path).write_text('{"path": "a.jpg"}\n\n{"path": "b.jpg"}\n')
+        jobs = iter_jobs(jobs_path)
+        self.assertEqual((1, '{"path": "a.jpg"}\n'), next(jobs))
+        self.assertEqual((3, '{"path": "b.jpg"}\n'), next(jobs))
+        self.assertIsNone(next(jobs, None))
+
+
+class TestRenderServer(TestUtilities):
+    """
+    A test class for the serve.py file, run against a server on localhost.
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """
+        Starts a server on a free port for the whole class.
+
+        :return: None
+        """
+        cls.server = RenderServer(("127.0.0.1", 0), jobs=2)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}/"
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        """
+        Stops the server.
+
+        :return: None
+        """
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def post(self, query: str, path: str = DEFAULT_IMAGE) -> tuple:
+        """
+        Posts an image to the server.
+
+        :param query: the query string of the request
+        :param path: the path of the image to post
+        :return: a tuple of the status, the headers, and the body of the response
+        """
+        request = urllib.request.Request(f"{self.url}?{query}", data=Path(path).read_bytes(), method="POST")
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers, error.read()
+
+    def test_health(self) -> None:
+        """
+        Tests that the server answers GET requests.
+
+        :return: None
+        """
+        with urllib.request.urlopen(self.url) as response:
+            self.assertEqual(200, response.status)
+
+    def test_render(self) -> None:
+        """
+        Tests that a posted image is rendered and encoded the same way the CLI would save it.
+
+        :return: None
+        """
+        status, headers, body = self.post("title=Test+Serve&tier=premium&size=YouTube")
+        self.assertEqual(200, status)
+        self.assertEqual("image/jpeg", headers["Content-Type"])
+        options = dict(title="Test Serve", tier="premium", size="YouTube")
+        expected = process_images(path=DEFAULT_IMAGE, **options)[0]
+        file_name, encoded = encode_image(expected, **options)
+        self.assertIn(file_name, headers["Content-Disposition"])
+        self.assertEqual(encoded, body)
+
+    def test_format(self) -> None:
+        """
+        Tests that the output format follows the format option, then the file name.
+
+        :return: None
+        """
+        _, headers, _ = self.post("title=Test+Format&format=webp")
+        self.assertEqual("image/webp", headers["Content-Type"])
+        _, headers, _ = self.post("filename=test-name.png")
+        self.assertEqual("image/png", headers["Content-Type"])
+        self.assertIn("test-name-v", headers["Content-Disposition"])
+
+    def test_invalid_options(self) -> None:
+        """
+        Tests that invalid options and images are rejected with a bad request.
+
+        :return: None
+        """
+        for query in ["tier=gold", "size=DEV,Twitter", "colour=red", "font=missing.ttf"]:
+            self.assertEqual(400, self.post(query)[0], query)
+        self.assertEqual(400, self.post("title=Test", path=os.path.join(PROJECT_ROOT, "README.md"))[0])
+
+    def test_unsafe_filename(self) -> None:
+        """
+        Tests that the filename option is reduced to a safe file name, so it can't inject headers.
+
+        :return: None
+        """
+        status, headers, _ = self.post("filename=a%0d%0aX-Evil:%20injected%0d%0a%22.jpg")
+        self.assertEqual(200, status)
+        self.assertIsNone(headers["X-Evil"])
+        self.assertTrue(headers["Content-Disposition"].startswith('attachment; filename="aX-Evil injected-v'))
+        self.assertEqual("a.jpg", parse_options("filename=..%2Fa.jpg")["path"])
+
+    def test_content_disposition(self) -> None:
+        """
+        Tests that file names are quoted and encoded in the Content-Disposition header.
+
+        :return: None
+        """
+        self.assertEqual(
+            "attachment; filename=\"a_b__c_.jpg\"; filename*=UTF-8''a%22b%0D%0Ac%C3%A9.jpg",
+            get_content_disposition('a"b\r\ncé.jpg')
+        )
+
+    def test_render_error(self) -> None:
+        """
+        Tests that an unexpected failure to render is still answered, with a server error.
+
+        :return: None
+        """
+        with patch("imagetitler.serve.process_image_data", side_effect=TypeError("unexpected")):
+            self.assertEqual(500, self.post("title=Test+Error")[0])
+
+    def test_concurrent_requests(self) -> None:
+        """
+        Tests that more requests than workers are all served.
+
+        :return: None
+        """
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            statuses = list(executor.map(lambda i: self.post(f"title=Test+Concurrent+{i}")[0], range(6)))
+        self.assertEqual([200] * 6, statuses)
+
+
+class TestRenderCache(TestUtilities):
+    """
+    A test class for the cache.py file.
+    """
+
+    def setUp(self) -> None:
+        """
+        Prepares an empty cache directory for each test.
+
+        :return: None
+        """
+        self.directory = tempfile.mkdtemp()
+        self.image_data = Path(DEFAULT_IMAGE).read_bytes()
+
+    def tearDown(self) -> None:
+        """
+        Deletes the cache directory.
+
+        :return: None
+        """
+        shutil.rmtree(self.directory)
+
+    def test_memory_eviction(self) -> None:
+        """
+        Tests that the least recently used entries are evicted from memory first.
+
+        :return: None
+        """
+        cache = RenderCache(memory_limit=20)
+        cache.put("a", "a.jpg", b"0" * 10)
+        cache.put("b", "b.jpg", b"0" * 10)
+        cache.get("a")
+        cache.put("c", "c.jpg", b"0" * 10)
+        self.assertEqual(("a.jpg", b"0" * 10), cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((2, 1), (cache.hits, cache.misses))
+
+    def test_disk_eviction(self) -> None:
+        """
+        Tests that the disk tier stays within its byte limit, evicting the least
+        recently used entries, and that it survives a new cache instance.
+
+        :return: None
+        """
+        cache = RenderCache(self.directory, disk_limit=40, memory_limit=0)
+        for key in "abc":
+            cache.put(key, f"{key}.jpg", b"0" * 10)  # 19 bytes each with the file name and its length
+        self.assertEqual(["b", "c"], sorted(os.listdir(self.directory)))
+        cache.get("b")
+        cache.put("d", "d.jpg", b"0" * 10)
+        self.assertEqual(["b", "d"], sorted(os.listdir(self.directory)))
+        self.assertEqual(("b.jpg", b"0" * 10), RenderCache(self.directory, disk_limit=40).get("b"))
+
+    def test_disk_entry(self) -> None:
+        """
+        Tests that entries on disk hold any file name and data, and that corrupt entries are forgotten.
+
+        :return: None
+        """
+        RenderCache(self.directory, memory_limit=0).put("a", "a\nb.jpg", b"\n0\n")
+        cache = RenderCache(self.directory, memory_limit=0)
+        self.assertEqual(("a\nb.jpg", b"\n0\n"), cache.get("a"))
+        Path(self.directory, "a").write_bytes(b"a.jpg\n0")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(0, cache.disk_bytes)
+
+    def test_cache_key(self) -> None:
+        """
+        Tests that the cache key tracks everything that affects the render, but not options that don't.
+
+        :return: None
+        """
+        key = get_cache_key(self.image_data, title="Test Key")
+        self.assertEqual(key, get_cache_key(self.image_data, title="Test Key", size=DEFAULT_SIZE, font=DEFAULT_FONT))
+        self.assertEqual(key, get_cache_key(self.image_data, title="Test Key", jobs=4, output_path="elsewhere"))
+        self.assertNotEqual(key, get_cache_key(self.image_data, title="Test Key", tier="free"))
+        self.assertNotEqual(key, get_cache_key(self.image_data + b"0", title="Test Key"))
+        font = os.path.join(self.directory, "font.ttf")
+        shutil.copy(CUSTOM_FONT, font)
+        font_key = get_cache_key(self.image_data, title="Test Key", font=font)
+        with open(font, "ab") as font_file:
+            font_file.write(b"0")
+        os.utime(font, ns=(0, 0))
+        self.assertNotEqual(font_key, get_cache_key(self.image_data, title="Test Key", font=font))
+
+    def test_render(self) -> None:
+        """
+        Tests that a repeated render is served from the cache without rendering again.
+
+        :return: None
+        """
+        cache = RenderCache(self.directory)
+        rendered = render(self.image_data, title="Test Cached Render", cache=cache)
+        with patch("imagetitler.serve.process_image_data") as process:
+            self.assertEqual(rendered, render(self.image_data, title="Test Cached Render", cache=cache))
+            self.assertEqual(rendered, render(self.image_data, title="Test Cached Render", cache=RenderCache(self.directory)))
+            process.assert_not_called()
+
+
+class TestVersion(TestUtilities):
+    """
+    A test class for the version module, which must match pyproject.toml.
+    """
+
+    def test_matches_pyproject(self) -> None:
+        """
+        Tests that the version module was updated alongside pyproject.toml.
+
+        :return: None
+        """
+        with open(os.path.join(PROJECT_ROOT, "pyproject.toml"), "rb") as f:
+            meta = tomllib.load(f)
+        self.assertEqual(meta["tool"]["poetry"]["version"], __version__)
+
+
+class TestImportTime(TestUtilities):
+    """
+    A test class which keeps the command line startup fast.
+    """
+
+    IMPORT_TIME_BUDGET = 500_000  # microseconds, generous to leave room for slow CI machines
+    DEFERRED_MODULES = [
+        "concurrent.futures.process",
+        "importlib.metadata",
+        "matplotlib",
+        "numpy",
+        "pathvalidate",
+        "piexif",
+        "titlecase",
+        "tomllib",
+    ]
+
+    def test_cli_import(self) -> None:
+        """
+        Tests that importing the CLI skips every deferred module and stays within budget.
+
+        :return: None
+        """
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import scripts.cli"],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        timings = dict()
+        for line in result.stderr.splitlines():
+            if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+                _, cumulative, module = line.split("|")
+                timings[module.strip()] = int(cumulative)
+        for module in self.DEFERRED_MODULES:
+            self.assertNotIn(module, timings, f"{module} should not be imported at startup")
+        self.assertLess(timings["scripts.cli"], self.IMPORT_TIME_BUDGET)